@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+"""Micro benchmarks for the level generator.
+
+Run ``python bench.py`` for everything or name the benchmarks to run, e.g.
+``python bench.py backends``.
+
+"""
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+
+import blocks
+from structs import Rect
+
+# Block edge lengths drawn for each distribution.
+DISTRIBUTIONS = {
+	'furniture':(1, 4),
+	'mixed':(1, 32),
+	'rooms':(16, 64),
+}
+
+def timed(func, *args, **kwargs):
+	"""Return how long, in seconds, a call to func took along with its result."""
+	start = time.time()
+	result = func(*args, **kwargs)
+	return time.time() - start, result
+
+def random_blocks(rng, world, count, low, high):
+	boxes = []
+	for _ in range(count):
+		width = rng.randint(low, high)
+		height = rng.randint(low, high)
+		left = rng.randint(world.left, world.right - width)
+		top = rng.randint(world.top, world.bottom - height)
+		boxes.append(blocks.Block(Rect(left, top, width, height)))
+	return boxes
+
+def bench_backends(size=256, count=1000, probes=200, seed=0):
+	"""Charge, hit and dismiss random blocks with every index backend."""
+	world = Rect(0, 0, size, size)
+	print("%-10s %-6s %10s %10s %10s" % (
+		'blocks', 'index', 'charge', 'hit', 'dismiss'))
+	for name, (low, high) in sorted(DISTRIBUTIONS.items()):
+		for backend in sorted(blocks.INDEXES):
+			rng = random.Random(seed)
+			boxes = random_blocks(rng, world, count, low, high)
+			queries = [box.rect for box in
+					   random_blocks(rng, world, probes, low, high)]
+			index = blocks.INDEXES[backend](world)
+
+			charge, _ = timed(lambda: [index.charge(box) for box in boxes])
+			hit, _ = timed(lambda: [index.hit(rect) for rect in queries])
+			dismiss, _ = timed(lambda: [index.dismiss(box) for box in boxes])
+			print("%-10s %-6s %9.1fms %9.1fms %9.1fms" % (
+				name, backend, charge*1000, hit*1000, dismiss*1000))
+
+def bench_snapshots(size=64, branches=1000, seed=0):
+	"""Try a bed in a furnished room, then backtrack, over and over."""
+	rng = random.Random(seed)
+	tree = blocks.Quad(Rect(0, 0, size, size))
+	room = blocks.Room(Rect(2, 2, size - 4, size - 4), name='room')
+	tree.charge(room)
+	for box in random_blocks(rng, Rect(0, 0, size - 4, size - 4), 50, 1, 4):
+		box.parent = room
+		room.children.add(box)
+		tree.charge(box)
+
+	def explore():
+		for _ in range(branches):
+			snapshot = tree.snapshot()
+			bed = blocks.Bed(Rect(rng.randint(0, size - 12),
+								  rng.randint(0, size - 16), 4, 8), room)
+			tree.charge(bed)
+			tree.hit(bed.rect)
+			tree.restore(snapshot)
+
+	elapsed, _ = timed(explore)
+	print("snapshots  %d branches in %.1fms (%.0f branches/s)" % (
+		branches, elapsed*1000, branches/elapsed))
+
+def bench_prefabs(count=500, seed=0):
+	"""Furnish a hotel with beds, built block by block and from a prefab."""
+	import prefab
+
+	size = 1
+	while size*size < count*64:
+		size *= 2
+	template = prefab.Prefab.from_block(blocks.Bed(Rect(0, 0, 4, 8)))
+	for name in ['blocks', 'prefab']:
+		rng = random.Random(seed)
+		tree = blocks.Quad(Rect(0, 0, size, size))
+
+		def furnish():
+			beds = []
+			for i in range(count):
+				left, top = (i*8) % size, (i*8) // size * 8
+				left += rng.randint(0, 3)
+				if name == 'blocks':
+					bed = blocks.Bed(Rect(left, top, 4, 8))
+				else:
+					bed = template.stamp(left, top)
+				tree.charge(bed)
+				beds.append(bed)
+			return beds
+
+		elapsed, beds = timed(furnish)
+		objects = len(beds) + sum(len(bed.children) for bed in beds)
+		charges = sum(len(quad.charges) for quad in tree.walk())
+		print("prefabs    %-6s %5d beds %6d blocks %7d charges %9.1fms" % (
+			name, count, objects, charges, elapsed*1000))
+
+def bench_import(runs=10):
+	"""Time cold imports of the library, with and without the renderer."""
+	here = os.path.dirname(os.path.abspath(__file__))
+	statements = [
+		('interpreter', 'pass'),
+		('blocks', 'import blocks'),
+		('blocks+render', 'import blocks, render'),
+	]
+	devnull = open(os.devnull, 'w')
+	for name, statement in statements:
+		best = None
+		for _ in range(runs):
+			elapsed, code = timed(subprocess.call, [sys.executable, '-c', statement],
+								  cwd=here, stderr=devnull)
+			if code:
+				print("import     %-14s failed" % name)
+				break
+			best = elapsed if best is None else min(best, elapsed)
+		else:
+			print("import     %-14s %7.1fms" % (name, best*1000))
+
+def bench_service(requests=400, clients=32, distinct=40, seed=0):
+	"""Load test the level service, with some levels asked for repeatedly."""
+	if sys.version_info < (3, 7):
+		print("service    skipped, needs Python 3.7+")
+		return
+	import asyncio
+	import service
+
+	formats = ['json']
+	try:
+		import render
+		formats.append('png')
+	except ImportError:
+		print("service    png skipped, PIL isn't installed")
+
+	rng = random.Random(seed)
+	for fmt in formats:
+		queries = ['seed=%d&size=64&format=%s' % (rng.randrange(distinct), fmt)
+				   for _ in range(requests)]
+		try:
+			latencies, elapsed, stats = asyncio.run(
+				service.benchmark(queries, clients))
+		except RuntimeError as e:
+			print("service    %-4s failed: %s" % (fmt, e))
+			continue
+		print("service    %-4s %d requests, %d clients: p50 %.1fms p99 %.1fms "
+			  "%.0f req/s (generated %d, coalesced %d, cached %d)" % (
+				  fmt, requests, clients,
+				  service.percentile(latencies, 0.5)*1000,
+				  service.percentile(latencies, 0.99)*1000,
+				  requests/elapsed, stats['generated'], stats['coalesced'],
+				  stats['hits']))
+
+def bench_cache(levels=10, seed=0):
+	"""Fetch levels from a cold on-disk cache, then from a warm one."""
+	import shutil
+	import tempfile
+
+	import cache
+	from generator import LevelGenerator
+
+	root = tempfile.mkdtemp(prefix='levelcache-')
+	try:
+		level_cache = cache.LevelCache(root)
+		generators = [LevelGenerator(seed + i) for i in range(levels)]
+		for state in ['cold', 'warm']:
+			elapsed, _ = timed(lambda: [level_cache.fetch(generator)
+										for generator in generators])
+			print("cache      %-4s %d levels %9.1fms (%.2fms each)" % (
+				state, levels, elapsed*1000, elapsed*1000/levels))
+	finally:
+		shutil.rmtree(root)
+
+def bench_stream(size=256, rooms=200, seed=0):
+	"""Generate a large level all at once, then streamed through sinks."""
+	import io
+	import sinks
+	from generator import LevelGenerator
+
+	generator = LevelGenerator(seed, size=size, rooms=rooms)
+	elapsed, level = timed(generator.generate)
+	print("stream     %-6s %6d blocks %14s total %9.1fms" % (
+		'whole', len(list(level.index)), '', elapsed*1000))
+
+	for name in ['ndjson', 'binary']:
+		out = io.BytesIO()
+		if name == 'ndjson':
+			# NDJSONWriter wants text, which is bytes on Python 2.
+			sink = sinks.NDJSONWriter(out if bytes is str else io.TextIOWrapper(out))
+		else:
+			sink = sinks.BinaryWriter(out)
+		start = time.time()
+		stream = generator.iter_generate()
+		sink.write(next(stream))
+		first = time.time() - start
+		count = sinks.stream(stream, sink) + 1
+		elapsed = time.time() - start
+		print("stream     %-6s %6d blocks first %6.2fms total %9.1fms" % (
+			name, count, first*1000, elapsed*1000))
+
+def bench_connectivity(size=4096, spacing=128, seed=0):
+	"""Find the reachable rooms of a large level of walled rooms with doors."""
+	try:
+		import connectivity
+	except ImportError:
+		print("connectivity skipped, NumPy isn't installed")
+		return
+
+	# Rooms only need to be in the level's tree, not charged to an index.
+	rng = random.Random(seed)
+	level = blocks.Level(Rect(0, 0, size, size), name='level')
+	for top in range(2, size - spacing, spacing):
+		for left in range(2, size - spacing, spacing):
+			width = rng.randint(spacing // 2, spacing - 4)
+			height = rng.randint(spacing // 2, spacing - 4)
+			room = blocks.Room(Rect(left, top, width, height), level)
+			if rng.random() < 0.5:
+				room.wall.exclusions = room.wall._exclusions + [
+					Rect(-1, rng.randint(0, height - 2), 1, 2)]
+
+	rasterize, grid = timed(connectivity.rasterize, level)
+	label, (_, count) = timed(connectivity.label, grid)
+	elapsed, groups = timed(connectivity.components, level)
+	print("connectivity %dx%d %d rooms: rasterize %.1fms label %.1fms "
+		  "(%d components) rooms %.1fms in %d groups" % (
+			  size, size, sum(len(group) for group in groups), rasterize*1000,
+			  label*1000, count, elapsed*1000, len(groups)))
+
+BENCHMARKS = {
+	'backends':bench_backends,
+	'cache':bench_cache,
+	'connectivity':bench_connectivity,
+	'import':bench_import,
+	'prefabs':bench_prefabs,
+	'service':bench_service,
+	'snapshots':bench_snapshots,
+	'stream':bench_stream,
+}
+
+if __name__ == "__main__":
+	logging.root.setLevel(logging.WARNING)
+	for name in sys.argv[1:] or sorted(BENCHMARKS):
+		BENCHMARKS[name]()
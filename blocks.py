@@ -3,8 +3,6 @@ import logging
 import random
 import sys
 
-import Image, ImageColor, ImageDraw
-
 LEVELS = {
 	'debug':logging.DEBUG,
 	'info':logging.INFO,
@@ -13,9 +11,25 @@ LEVELS = {
 	'critical':logging.CRITICAL,
 }
 
+# Colours are plain RGB tuples so levels can be built without PIL.
+COLORS = {
+	'black':(0, 0, 0),
+	'blue':(0, 0, 255),
+	'brown':(165, 42, 42),
+	'chocolate':(210, 105, 30),
+	'crimson':(220, 20, 60),
+	'darkcyan':(0, 139, 139),
+	'green':(0, 128, 0),
+	'grey':(128, 128, 128),
+	'orange':(255, 165, 0),
+	'white':(255, 255, 255),
+	'yellow':(255, 255, 0),
+}
+
 FORMAT = "%(levelname)-6s %(message)s"
 logging.basicConfig(level=logging.INFO, format=FORMAT)
 
+from spatial import SpatialIndex, GridIndex
 from structs import Rect
 
 def get_bounding_box(quads):
@@ -25,7 +39,7 @@ def get_bounding_box(quads):
 	b = max(quad.rect.bottom for quad in quads)
 	return Rect(l, t, r-l, b-t)
 
-class Quad(object):
+class Quad(SpatialIndex):
 	"""A meta-block that contains the overall structure of the tree."""
 	def __init__(self, rect, parent=None):
 		self.rect = rect
@@ -33,10 +47,68 @@ class Quad(object):
 		# Empty (None) quads propigate data from the first sibling
 		self.quads = [None, None, None, None]
 		self.charges = set([])
+		# Quads never change parents, so the root is found once.
+		self._root = parent.root if parent else self
+		# Undo log kept by the root once a snapshot has been taken.
+		self._journal = None
 
 	def __repr__(self):
 		return "Quad(%s)" % (self.rect,)
 
+	def __iter__(self):
+		seen = set([])
+		for quad in self.walk():
+			for block in quad.charges:
+				if block not in seen:
+					seen.add(block)
+					yield block
+
+	def walk(self):
+		"""Yield this quad and every sub-quad beneath it, depth first."""
+		yield self
+		for quad in self.quads:
+			if quad:
+				for sub_quad in quad.walk():
+					yield sub_quad
+
+	def snapshot(self):
+		"""Return a snapshot of the tree that restore() can roll back to.
+
+		Taking a snapshot is O(1). From the first one on, the root journals
+		how to undo every change made to the tree, so each mutation only
+		records the nodes and charges it touches. Restoring to a snapshot
+		invalidates any taken after it.
+
+		"""
+		root = self.root
+		if root._journal is None:
+			root._journal = []
+		return len(root._journal)
+
+	def restore(self, snapshot):
+		"""Roll the tree, and the charges of its blocks, back to a snapshot.
+
+		Blocks linked to a charged parent since the snapshot are unlinked
+		from it again. Links made before the snapshot are left alone.
+
+		"""
+		journal = self.root._journal
+		if journal is None or snapshot > len(journal):
+			raise ValueError("No snapshot %s to restore %s to" % (snapshot, self.root))
+		while len(journal) > snapshot:
+			undo, args = journal.pop()
+			undo(*args)
+
+	def release(self):
+		"""Stop journaling changes, invalidating every snapshot."""
+		self.root._journal = None
+
+	def _record(self, undo, *args):
+		"""Journal how to undo a change, if snapshots are being taken."""
+		journal = self._root._journal
+		if journal is not None:
+			journal.append((undo, args))
+
 	def attempt_tear_down(self):
 		"""Only tear_down if it would make sense. Safe to call whenever.
 
@@ -48,12 +120,24 @@ class Quad(object):
 		if not self.charges:
 			# But what about sub-quads?
 			if not [sub_quad for sub_quad in self.quads
-				if sub_quad and sub_quad.attempt_tear_down()]:
+				if sub_quad and not sub_quad.attempt_tear_down()]:
 				# All existing sub_quads are torn down so we're good to go.
 				return self.tear_down()
 
 		return False
 
+	def discharge(self, block):
+		"""Release a block from this quad's care"""
+		if self._root._journal is not None:
+			self._record(block.quads.insert, block.quads.index(self), self)
+			self._record(self.charges.add, block)
+			# Block.tear_down drops blocks left without quads from their parent.
+			if len(block.quads) == 1 and block.parent and block in block.parent.children:
+				self._record(block.parent.children.add, block)
+		block.quads.remove(self)
+		self.charges.remove(block)
+		self.attempt_tear_down()
+
 	def tear_down(self):
 		"""Tear down this quad.
 
@@ -61,17 +145,21 @@ class Quad(object):
 			Boolean - True if the quad was successfully torn down.
 
 		"""
+		# The root holds the tree together and can't be torn down.
+		if not self.parent:
+			return False
+
 		logging.debug("-- Tearing down %s" % self)
-		self.parent.quads[self.parent.quads.index(self)] = None
+		pos = self.parent.quads.index(self)
+		if self._root._journal is not None:
+			self._record(self.parent.quads.__setitem__, pos, self)
+		self.parent.quads[pos] = None
 		return True
 
 	@property
 	def root(self):
-		"""Recursively walk up the tree to the root"""
-		if self.parent:
-			return self.parent.root
-		else:
-			return self
+		"""The quad at the top of the tree"""
+		return self._root
 
 	def hit(self, rect, strict=False, hits=None):
 		"""Return a set of blocks that collide with a passed rect.
@@ -109,18 +197,29 @@ class Quad(object):
 			#print "%s Parent ==" % block, block.parent, block.parent.quads
 			#quads = block.parent.quads[0]._allocate(block.rect)
 		else:
-			quads = self._allocate(block.rect, block.exclusions)
+			quads = self.charge_rect(block, block.rect, block.exclusions)
 		#quads.sort()
+		self._record(setattr, block, 'quads', block.quads)
 		block.quads = quads
 		logging.info("Finished charging %s" % block)
-		[quad.charges.add(block) for quad in quads]
 
 		for child in block.children:
 			self.charge(child)
 
-	def dismiss(self, block, rect=None):
-		"""Dismiss a block, or a rect portion of one, from a quad's service"""
-		block.tear_down(rect)
+	def charge_rect(self, block, rect, exclusions=None):
+		"""Charge a rect portion of a block and return the quads it took.
+
+		Unlike charge this leaves block.quads and the block's children alone.
+
+		"""
+		quads = self._allocate(rect, exclusions)
+		journaling = self._root._journal is not None
+		for quad in quads:
+			if block not in quad.charges:
+				if journaling:
+					self._record(quad.charges.discard, block)
+				quad.charges.add(block)
+		return quads
 
 	def _assign_new_quads(self, shards):
 		"""Create any quads we'll need all at once. At most one fracture call."""
@@ -129,6 +228,7 @@ class Quad(object):
 		if needed:
 			new_quads = self.rect.fracture(self.rect.center)
 			for pos in needed:
+				self._record(self.quads.__setitem__, pos, None)
 				self.quads[pos] = Quad(new_quads[pos], self)
 				logging.debug("Generating new %s" % self.quads[pos])
 
@@ -199,6 +299,7 @@ class Quad(object):
 class Block(object):
 	"""Base building block"""
 	layer = 1
+	color = None
 
 	def __init__(self, rect, parent=None, name='', abs=False, exclusions=None, **kwargs):
 		self.name = name or self.__class__.__name__.lower()
@@ -207,7 +308,7 @@ class Block(object):
 		self.abs = abs
 		self.parent = parent
 		if parent:
-			self.parent.children.add(self)
+			self._link(parent)
 		self.quads = []
 		self.children = set([])
 		self.init(**kwargs)
@@ -216,6 +317,15 @@ class Block(object):
 		"""Intended to be overwritten by subclasses."""
 		pass
 
+	def _link(self, parent):
+		"""Add the block to its parent's children, journaling it if need be."""
+		parent.children.add(self)
+		# An index taking snapshots of the parent undoes the link on restore.
+		for node in parent.quads[:1]:
+			record = getattr(node, '_record', None)
+			if record:
+				record(parent.children.discard, self)
+
 	def __repr__(self):
 		return "%s(name: %s, %s, quads: %s)" % (
 			self.__class__.__name__,
@@ -233,9 +343,7 @@ class Block(object):
 		logging.info("-- Tearing down %s" % self)
 		for quad in set(self.quads):
 			if rect is None or (rect and quad.rect in rect):
-				self.quads.remove(quad)
-				quad.charges.remove(self)
-				quad.attempt_tear_down()
+				quad.discharge(self)
 
 		if not self.quads and self.parent:
 			self.parent.children.discard(self)
@@ -273,16 +381,58 @@ class Block(object):
 	def type_root(self):
 		return self.parent is None or not isinstance(self.parent, self.__class__)
 
+	def describe(self):
+		"""Return the block as plain data, ready to be serialized."""
+		return {
+			'kind':self.__class__.__name__,
+			'name':self.name,
+			'rect':list(self.rect),
+			'layer':self.layer,
+			'color':list(self.color) if self.color else None,
+		}
+
+class Backends(dict):
+	"""Index backends by name.
+
+	A backend may be registered as a 'module.Class' path, which is imported
+	the first time it is looked up. This lets backends living in modules
+	that import this one be registered here all the same.
+
+	"""
+	def __getitem__(self, name):
+		backend = dict.__getitem__(self, name)
+		if isinstance(backend, str):
+			module, _, attr = backend.rpartition('.')
+			backend = getattr(__import__(module), attr)
+			self[name] = backend
+		return backend
+
+INDEXES = Backends({
+	'quad':Quad,
+	'grid':GridIndex,
+	'chunked':'world.World',
+})
+
 class Level(Block):
 	"""A container for all the Blocks in a level"""
+	def init(self, backend='quad', **index_options):
+		self.backend = backend
+		self.index_options = index_options
+		# The index the level was last charged to.
+		self.index = None
+
+	def build_index(self):
+		"""Return an empty index of the level's backend covering the level."""
+		return INDEXES[self.backend](self.rect, **self.index_options)
 
 class Room(Block):
 	"""An arbitrary room."""
 	def init(self, wall_class=None):
 		if wall_class is None:
 			wall_class = Wall
-		self.wall = wall_class(self.rect, self)
-		self.wall.color = ImageColor.getrgb('chocolate')
+		# The wall is placed relative to the room, and so is its exclusion.
+		self.wall = wall_class(Rect(0, 0, self.rect.width, self.rect.height), self)
+		self.wall.color = COLORS['chocolate']
 
 class Wall(Block):
 	"""An arbitrary wall."""
@@ -332,8 +482,7 @@ class Bedroom(Room):
 		super(Bedroom, self).init(wall_class)
 
 class Bed(Furniture):
-	def init(self, color=ImageColor.getrgb('white'),
-			 decor_color=ImageColor.getrgb('blue')):
+	def init(self, color=COLORS['white'], decor_color=COLORS['blue']):
 		self.color = color
 
 		self.pillow = Decor(Rect(1, 1, 2, 1), self, 'pillow')
@@ -342,10 +491,10 @@ class Bed(Furniture):
 		self.sheet = Decor(Rect(0, 3, 4, 5), self, 'sheet')
 		self.sheet.color = decor_color
 
-	def tear_down(self):
-		self.pillow.tear_down()
-		self.sheet.tear_down()
-		super(Bed, self).tear_down()
+	def tear_down(self, rect=None):
+		self.pillow.tear_down(rect)
+		self.sheet.tear_down(rect)
+		super(Bed, self).tear_down(rect)
 
 if __name__ == "__main__":
 	if len(sys.argv) > 1:
@@ -353,84 +502,58 @@ if __name__ == "__main__":
 		level = LEVELS.get(level_name, logging.NOTSET)
 		logging.root.setLevel(level)
 
-	mode = 'RGB'
 	size = 32
-	scale = 1
 	def build_tree():
 		tree = Quad(Rect(0, 0, size, size))
 		level = Level(Rect(0, 0, size, size))
-		level.color = ImageColor.getcolor('grey', mode)
+		level.color = COLORS['grey']
 		tree.charge(level)
 
 		room = Room(Rect(4, 4, 16, 16), level, name='room')
-		room.color = ImageColor.getcolor('orange', mode)
+		room.color = COLORS['orange']
 		tree.charge(room)
 
 		table = Furniture(Rect(0, 0, 4, 3), room, name='table')
-		table.color = ImageColor.getcolor('brown', mode)
+		table.color = COLORS['brown']
 
 		lamp = Furniture(Rect(1, 1, 1, 1), table, name='lamp')
-		lamp.color = ImageColor.getcolor('yellow', mode)
+		lamp.color = COLORS['yellow']
 
 		tree.charge(table)
 
-		bed = Bed(Rect(4, 0, 4, 8), room, color=ImageColor.getrgb('white'),
-				 decor_color=ImageColor.getrgb('darkcyan'))
+		bed = Bed(Rect(4, 0, 4, 8), room, color=COLORS['white'],
+				 decor_color=COLORS['darkcyan'])
 		tree.charge(bed)
 
-		bed2 = Bed(Rect(9, 0, 4, 8), room, color=ImageColor.getrgb('white'),
-				 decor_color=ImageColor.getrgb('crimson'))
+		bed2 = Bed(Rect(9, 0, 4, 8), room, color=COLORS['white'],
+				 decor_color=COLORS['crimson'])
 		tree.charge(bed2)
 
 		bed2.tear_down()
 
 		#bed = Furniture(Rect(4, 0, 4, 8), room, name='bed')
-		#bed.color = ImageColor.getcolor('green', mode)
+		#bed.color = COLORS['green']
 		#tree.charge(bed)
 
 		#pillow = Furniture(Rect(1, 1, 2, 1), bed, name='pillow')
-		#pillow.color = ImageColor.getcolor('white', mode)
+		#pillow.color = COLORS['white']
 		#tree.charge(pillow)
 
 		#sheet = Furniture(Rect(0, 3, 4, 5), bed, name='sheet')
-		#sheet.color = ImageColor.getcolor('white', mode)
+		#sheet.color = COLORS['white']
 		#tree.charge(sheet)
 
 		lump = Block(Rect(32, 32, 8, 8), room, name='lump', abs=True)
-		lump.color = ImageColor.getcolor('black', mode)
+		lump.color = COLORS['black']
 		tree.charge(lump)
 
 		return tree
 
-	def draw_tree(tree, canvas):
-		charges = list(tree.charges)
-		# Force lower layers to the front of the line
-		charges.sort(key=lambda x: x.layer)
-		for block in charges:
-			logging.info("Painting: %s\t%s" % (block.name, tree.rect))
-			box = list(tree.rect)
-			box[2] -= 1
-			box[3] -= 1
-			canvas.rectangle(box, fill=block.color)
-		for quad in tree.quads:
-			if quad:
-				draw_tree(quad, canvas)
-
 	def test():
-		scaled = size*scale
-
-		im = Image.new(
-			mode, (scaled, scaled),
-			color=ImageColor.getcolor('rgb(124, 124, 124)', mode)
-		)
-		canvas = ImageDraw.Draw(im)
+		import render
 
 		tree = build_tree()
-		draw_tree(tree, canvas)
-
-		#box = [Point(size/6, size/6) * scale, (Point(size-size/6, size-size/6) * scale)-1]
-		#canvas.rectangle(box, fill=colors[random.randint(0, 1)])
-		im = im.resize((size*10, size*10))
+		im = render.render(tree, Rect(0, 0, size, size), scale=10)
 		name = 'level.png'
 		logging.info("Saving to %s" % name)
 		im.save(name)
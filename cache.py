@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""An on-disk cache of generated levels.
+
+Levels are deterministic, so each one is stored under a hash of its
+generator parameters, the render scale and the source of the code that
+builds it. The index looks the same at any scale, so it is stored once
+under a key without one. An entry is a directory holding a serialized index
+or a rendered image. Each entry is written to a private directory and
+renamed into place whole, so concurrent writers never expose a partial one.
+The least recently used entries are evicted once the cache outgrows its
+size budget.
+
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from generator import by_position
+
+INDEX = 'index.json'
+IMAGE = 'level.png'
+
+# Modules whose source decides what a level, or its stored form, looks like.
+SOURCES = ['blocks', 'cache', 'generator', 'prefab', 'render', 'spatial',
+		   'structs', 'world']
+
+# Leftovers of writers and evictions that died part way through are removed
+# once they're this many seconds old.
+STALE = 10*60
+
+_code_version = None
+
+def code_version():
+	"""Return a hash of the source of every module levels are built by."""
+	global _code_version
+	if _code_version is None:
+		digest = hashlib.sha1()
+		here = os.path.dirname(os.path.abspath(__file__))
+		for name in SOURCES:
+			with open(os.path.join(here, name + '.py'), 'rb') as f:
+				digest.update(f.read())
+		_code_version = digest.hexdigest()
+	return _code_version
+
+def encode_index(generator, level):
+	"""Return a level's blocks, and the parameters behind them, as JSON."""
+	return json.dumps({
+		'params':generator.params(),
+		'blocks':[block.describe() for block in sorted(level.index, key=by_position)],
+	}, sort_keys=True).encode('utf-8')
+
+def encode_image(level, scale=1):
+	"""Return a level rendered as a PNG."""
+	import render
+	out = io.BytesIO()
+	render.render(level.index, level.rect, scale).save(out, 'PNG')
+	return out.getvalue()
+
+class LevelCache(object):
+	"""Generated levels stored on disk under root, up to max_bytes of them."""
+	def __init__(self, root, max_bytes=256*1024*1024):
+		self.root = root
+		self.max_bytes = max_bytes
+		if not os.path.isdir(root):
+			try:
+				os.makedirs(root)
+			except OSError:
+				# Someone else made it first.
+				if not os.path.isdir(root):
+					raise
+
+	def key(self, generator, scale=None):
+		"""Return the address of a generator's level.
+
+		The index is addressed without a scale, and images with one.
+
+		"""
+		text = json.dumps([generator.params(), scale, code_version()], sort_keys=True)
+		return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+	def get(self, key, name):
+		"""Return the named file of an entry, or None if it isn't cached."""
+		path = os.path.join(self.root, key)
+		try:
+			with open(os.path.join(path, name), 'rb') as f:
+				data = f.read()
+			# The directory's mtime records when the entry was last used.
+			os.utime(path, None)
+		except (IOError, OSError):
+			return None
+		return data
+
+	def put(self, key, files):
+		"""Store files, a dict of file names to contents, as an entry."""
+		# Nobody else sees the entry until it's renamed into place whole.
+		staging = tempfile.mkdtemp(prefix='.tmp-', dir=self.root)
+		try:
+			for name, data in files.items():
+				with open(os.path.join(staging, name), 'wb') as f:
+					f.write(data)
+			try:
+				os.rename(staging, os.path.join(self.root, key))
+			except OSError:
+				# Another writer stored the same entry first.
+				if not os.path.isdir(os.path.join(self.root, key)):
+					raise
+		finally:
+			shutil.rmtree(staging, ignore_errors=True)
+		self.evict()
+
+	def fetch(self, generator, name=INDEX, scale=1):
+		"""Return a named file of a generator's level, generating it if need be."""
+		index_key = self.key(generator)
+		key = self.key(generator, scale) if name == IMAGE else index_key
+		data = self.get(key, name)
+		if data is not None:
+			return data
+
+		logging.info("Cache miss for %s" % (generator,))
+		level = generator.generate()
+		index = encode_index(generator, level)
+		if name == INDEX:
+			self.put(key, {INDEX:index})
+			return index
+
+		data = encode_image(level, scale)
+		self.put(key, {IMAGE:data})
+		if self.get(index_key, INDEX) is None:
+			self.put(index_key, {INDEX:index})
+		return data
+
+	def entries(self):
+		"""Return (last used, size, key) for every entry, oldest first."""
+		entries = []
+		for key in os.listdir(self.root):
+			if key.startswith('.'):
+				continue
+			path = os.path.join(self.root, key)
+			try:
+				size = sum(os.path.getsize(os.path.join(path, name))
+						   for name in os.listdir(path) if not name.startswith('.'))
+				entries.append((os.path.getmtime(path), size, key))
+			except OSError:
+				# Evicted from under us.
+				continue
+		entries.sort()
+		return entries
+
+	def evict(self):
+		"""Remove the least recently used entries until under budget."""
+		self._clean()
+		entries = self.entries()
+		total = sum(size for _, size, _ in entries)
+		for _, size, key in entries:
+			if total <= self.max_bytes:
+				break
+			logging.debug("Evicting %s from the level cache" % key)
+			# Rename first so readers see the whole entry or nothing.
+			doomed = os.path.join(self.root, '.evicted-%s-%s' % (key, time.time()))
+			try:
+				os.rename(os.path.join(self.root, key), doomed)
+			except OSError:
+				continue
+			shutil.rmtree(doomed, ignore_errors=True)
+			total -= size
+
+	def _clean(self):
+		"""Remove stale staging and evicted directories."""
+		now = time.time()
+		for name in os.listdir(self.root):
+			if not name.startswith(('.tmp-', '.evicted-')):
+				continue
+			path = os.path.join(self.root, name)
+			try:
+				if now - os.path.getmtime(path) < STALE:
+					continue
+			except OSError:
+				continue
+			logging.debug("Removing stale %s from the level cache" % name)
+			shutil.rmtree(path, ignore_errors=True)
@@ -1,8 +1,190 @@
 #!/usr/bin/env python
+import logging
+import random
+
+import blocks
+from structs import Rect
+
+def by_position(block):
+	"""Sort key giving blocks a stable order, unlike the sets they live in."""
+	rect = block.rect
+	return (rect.top, rect.left, rect.width, rect.height, block.name)
+
+def subtree(block):
+	"""Return a block and all of its descendants, parents first."""
+	found = [block]
+	for child in sorted(block.children, key=by_position):
+		found.extend(subtree(child))
+	return found
 
 class LevelGenerator(object):
-	def __init__(self):
-		pass
-	
+	"""Lays out a level of furnished rooms.
+
+	Levels are reproducible: the same seed and parameters always give the
+	same level. Rooms, and the furniture in each room, are placed in the
+	order they are laid out, and anything colliding with what was placed
+	before it is left out.
+
+	generate() works in three phases: build every block, charge them all,
+	then prune the ones that collide. iter_generate() places blocks one at
+	a time instead, yielding each as soon as it is charged. Both give the
+	same level.
+
+	"""
+	def __init__(self, seed=0, size=64, rooms=6, backend='quad', **index_options):
+		self.seed = seed
+		self.size = size
+		self.rooms = rooms
+		self.backend = backend
+		self.index_options = index_options
+
+	def __repr__(self):
+		return "LevelGenerator(seed=%s, size=%s, rooms=%s, backend=%s)" % (
+			self.seed, self.size, self.rooms, self.backend)
+
+	def params(self):
+		"""Return every parameter that shapes the level, as plain data."""
+		params = dict(self.index_options)
+		params.update(seed=self.seed, size=self.size, rooms=self.rooms,
+					  backend=self.backend)
+		return params
+
+	def layout(self):
+		"""Yield the rect of every room, along with its furniture, in order.
+
+		Furniture is given as (kind, rect, colour) with rects relative to the
+		room. No Blocks are made.
+
+		"""
+		rng = random.Random(self.seed)
+		for _ in range(self.rooms):
+			width = rng.randint(8, max(8, self.size // 3))
+			height = rng.randint(10, max(10, self.size // 3))
+			# Leave space for the walls around the room.
+			left = rng.randint(1, max(1, self.size - width - 1))
+			top = rng.randint(1, max(1, self.size - height - 1))
+
+			furniture = []
+			for _ in range(rng.randint(1, 3)):
+				rect = Rect(rng.randint(0, width - 4), rng.randint(0, height - 8), 4, 8)
+				color = rng.choice(['blue', 'crimson', 'darkcyan'])
+				furniture.append(('bed', rect, blocks.COLORS[color]))
+			rect = Rect(rng.randint(0, width - 3), rng.randint(0, height - 2), 3, 2)
+			furniture.append(('table', rect, blocks.COLORS['brown']))
+
+			yield Rect(left, top, width, height), furniture
+
 	def generate(self):
-		pass
\ No newline at end of file
+		"""Return a finished Level, charged to an index of its backend."""
+		level = self.build()
+		index = self.charge(level)
+		self.prune(level, index)
+		return level
+
+	def iter_generate(self):
+		"""Yield each Block of a finished Level as it is charged.
+
+		The Level itself comes first, and its index is ready to be queried
+		as soon as it has been yielded. Every other block follows its parent.
+
+		"""
+		level = self._make_level()
+		index = level.build_index()
+		level.index = index
+		index.charge(level)
+		yield level
+
+		for rank, (rect, furniture) in enumerate(self.layout()):
+			room = self._make_room(level, rect, (rank,))
+			if index.hit(room.wall.rect) - set([level]):
+				logging.debug("Leaving out %s" % room)
+				level.children.discard(room)
+				continue
+			index.charge(room)
+			for block in subtree(room):
+				yield block
+
+			for item_rank, spec in enumerate(furniture):
+				item = self._make_furniture(room, spec, (rank, item_rank))
+				if index.hit(item.rect) - set([level, room]):
+					logging.debug("Leaving out %s" % item)
+					room.children.discard(item)
+					continue
+				index.charge(item)
+				for block in subtree(item):
+					yield block
+
+	def build(self):
+		"""Lay out the level's Blocks without charging them anywhere."""
+		level = self._make_level()
+		for rank, (rect, furniture) in enumerate(self.layout()):
+			room = self._make_room(level, rect, (rank,))
+			for item_rank, spec in enumerate(furniture):
+				self._make_furniture(room, spec, (rank, item_rank))
+		return level
+
+	def charge(self, level):
+		"""Charge a built level to a new index and return the index."""
+		index = level.build_index()
+		index.charge(level)
+		level.index = index
+		return index
+
+	def prune(self, level, index):
+		"""Dismiss rooms and furniture that collide with ones placed before."""
+		# Every block shares the placement rank of the room or furniture
+		# it belongs to.
+		ranks = {}
+		for room in level.children:
+			for block in subtree(room):
+				ranks[block] = room.rank
+			for item in room.children:
+				if item is not room.wall:
+					for block in subtree(item):
+						ranks[block] = item.rank
+
+		for room in sorted(level.children, key=lambda room: room.rank):
+			if self._collides(index, room.wall, ranks):
+				logging.debug("Pruning %s" % room)
+				self._dismiss(index, room)
+				continue
+
+			furniture = [item for item in room.children if item is not room.wall]
+			for item in sorted(furniture, key=lambda item: item.rank):
+				if self._collides(index, item, ranks, ignore=room):
+					logging.debug("Pruning %s" % item)
+					self._dismiss(index, item)
+
+	def _make_level(self):
+		level = blocks.Level(Rect(0, 0, self.size, self.size), name='level',
+							 backend=self.backend, **self.index_options)
+		level.color = blocks.COLORS['grey']
+		return level
+
+	def _make_room(self, level, rect, rank):
+		room = blocks.Room(rect, level)
+		room.color = blocks.COLORS['orange']
+		room.rank = rank
+		return room
+
+	def _make_furniture(self, room, spec, rank):
+		kind, rect, color = spec
+		if kind == 'bed':
+			item = blocks.Bed(rect, room, decor_color=color)
+		else:
+			item = blocks.Furniture(rect, room, name=kind)
+			item.color = color
+		item.rank = rank
+		return item
+
+	def _collides(self, index, block, ranks, ignore=None):
+		"""Return True if a block hits anything placed before it."""
+		rank = ranks[block]
+		return bool([hit for hit in index.hit(block.rect)
+					 if hit in ranks and ranks[hit] < rank and hit is not ignore])
+
+	def _dismiss(self, index, block):
+		"""Dismiss a block and everything it contains."""
+		for child in list(block.children):
+			self._dismiss(index, child)
+		index.dismiss(block)
@@ -1,11 +1,80 @@
+#!/usr/bin/env python
+import argparse
+import logging
+
 import blocks
+from generator import LevelGenerator
+
+def generate_level(seed=0, **options):
+	return LevelGenerator(seed, **options).generate()
+
+def profile_level(generator, output, folded, scale=1):
+	"""Generate, render and save a level, profiling each phase."""
+	import render
+	from profiling import PhaseProfiler
+
+	profiler = PhaseProfiler()
+	with profiler.phase('build'):
+		level = generator.build()
+	with profiler.phase('charge'):
+		index = generator.charge(level)
+	with profiler.phase('prune'):
+		generator.prune(level, index)
+	with profiler.phase('render'):
+		image = render.render(index, level.rect, scale)
+	with profiler.phase('save'):
+		image.save(output)
+
+	profiler.report()
+	profiler.write_folded(folded)
+	print("Wrote %s and collapsed stacks to %s" % (output, folded))
+	return level
 
-def generate_level():
-	return Level()
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Generate a level.")
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--size', type=int, default=64)
+	parser.add_argument('--rooms', type=int, default=6)
+	parser.add_argument('--backend', choices=sorted(blocks.INDEXES), default='quad')
+	parser.add_argument('--scale', type=int, default=10)
+	parser.add_argument('--output', help="render the level to this image")
+	parser.add_argument('--cache', metavar='DIR',
+						help="reuse levels cached in DIR, and cache new ones there")
+	parser.add_argument('--ndjson', metavar='PATH',
+						help="stream the level's blocks to PATH as they are placed")
+	parser.add_argument('--log', choices=sorted(blocks.LEVELS), default='warning')
+	parser.add_argument('--profile', action='store_true',
+						help="profile generation and rendering phase by phase")
+	parser.add_argument('--folded', default='profile.folded',
+						help="where --profile writes collapsed stacks")
+	args = parser.parse_args(argv)
+	logging.root.setLevel(blocks.LEVELS[args.log])
 
-def main():
-	level = generate_level()
-	print level
+	generator = LevelGenerator(args.seed, args.size, args.rooms, args.backend)
+	if args.profile:
+		level = profile_level(generator, args.output or 'level.png',
+							  args.folded, args.scale)
+	elif args.ndjson:
+		import sinks
+		with open(args.ndjson, 'w') as f:
+			count = sinks.stream(generator.iter_generate(), sinks.NDJSONWriter(f))
+		level = "%r streamed %d blocks to %s" % (generator, count, args.ndjson)
+	elif args.cache:
+		import cache
+		level_cache = cache.LevelCache(args.cache)
+		if args.output:
+			with open(args.output, 'wb') as f:
+				f.write(level_cache.fetch(generator, cache.IMAGE, args.scale))
+		else:
+			level_cache.fetch(generator)
+		key = level_cache.key(generator, args.scale if args.output else None)
+		level = "%r cached as %s" % (generator, key)
+	else:
+		level = generator.generate()
+		if args.output:
+			import render
+			render.render(level.index, level.rect, args.scale).save(args.output)
+	print(level)
 
 if __name__ == "__main__":
-	main()
\ No newline at end of file
+	main()
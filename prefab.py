@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+import logging
+
+from collections import namedtuple
+
+import blocks
+from structs import Rect, pieces
+
+# A single Block of a prefab. Rects are relative to the prefab's origin
+# until an Instance places them in the level.
+Part = namedtuple('Part', 'name kind rect exclusions layer color')
+
+def _offset(rect, dx, dy):
+	return Rect(rect.left+dx, rect.top+dy, rect.width, rect.height)
+
+class Prefab(object):
+	"""A Block subtree captured once so it can be stamped many times.
+
+	The origin of a prefab is the top left of the Block it was captured
+	from. Its rect is the bounding box of every part, which can reach past
+	the origin (walls sit outside their room, for instance).
+
+	"""
+	def __init__(self, parts, name=''):
+		# Lower layers first, so parts can be painted in order.
+		self.parts = tuple(sorted(parts, key=lambda part: part.layer))
+		self.name = name
+		self.rect = blocks.get_bounding_box(self.parts)
+		root = parts[0]
+		self.layer = root.layer
+		self.color = root.color
+
+	def __repr__(self):
+		return "Prefab(name: %s, %s, parts: %s)" % (
+			self.name, self.rect, len(self.parts))
+
+	@classmethod
+	def from_block(cls, block):
+		"""Capture a Block and all its descendants as a Prefab."""
+		origin = block.rect
+		dx, dy = -origin.left, -origin.top
+		parts = []
+		pending = [block]
+		while pending:
+			current = pending.pop(0)
+			parts.append(Part(
+				current.name, current.__class__,
+				_offset(current.rect, dx, dy),
+				tuple(_offset(exclusion, dx, dy)
+					  for exclusion in current.exclusions),
+				current.layer, getattr(current, 'color', None)))
+			pending.extend(current.children)
+		logging.debug("Captured %s parts from %s" % (len(parts), block))
+		return cls(parts, block.name)
+
+	def stamp(self, left, top, parent=None, name='', abs=False):
+		"""Return an Instance of the prefab with its origin at left, top."""
+		rect = _offset(self.rect, left, top)
+		return Instance(rect, parent, name or self.name, abs, prefab=self)
+
+class Instance(blocks.Block):
+	"""A stamped Prefab, charged to an index as a single Block.
+
+	An instance only stores where it is. Its parts, along with their layers
+	and colours, are shared with the prefab and only placed when asked for.
+
+	"""
+	def init(self, prefab=None):
+		self.prefab = prefab
+
+	@property
+	def layer(self):
+		return self.prefab.layer
+
+	@property
+	def color(self):
+		return self.prefab.color
+
+	def parts(self, rect=None):
+		"""Yield the prefab's parts placed in the level.
+
+		If a rect is passed only the parts colliding with it are yielded.
+
+		"""
+		own = self.rect
+		dx = own.left - self.prefab.rect.left
+		dy = own.top - self.prefab.rect.top
+		for part in self.prefab.parts:
+			placed = _offset(part.rect, dx, dy)
+			exclusions = tuple(_offset(exclusion, dx, dy)
+							   for exclusion in part.exclusions)
+			# Only the part outside its exclusions can collide.
+			if rect is not None and not [piece for piece in
+					pieces(placed, exclusions) if piece in rect]:
+				continue
+			yield part._replace(rect=placed, exclusions=exclusions)
+
+def expand(hits, rect=None):
+	"""Return a list of hits with every Instance replaced by its parts."""
+	expanded = []
+	for block in hits:
+		if isinstance(block, Instance):
+			expanded.extend(block.parts(rect))
+		else:
+			expanded.append(block)
+	return expanded
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+"""Time, memory and call profiles of level generation, split into phases."""
+import cProfile
+import os
+import pstats
+import signal
+import sys
+import time
+
+from contextlib import contextmanager
+
+try:
+	import tracemalloc
+except ImportError:
+	# Python 2 has no tracemalloc, so memory falls back to getrusage there.
+	tracemalloc = None
+
+try:
+	import resource
+except ImportError:
+	resource = None
+
+# Names of the two memory columns. Without tracemalloc they're only the
+# process's resident set size, which the phase itself may not have touched.
+if tracemalloc:
+	MEMORY = ('allocated', 'peak')
+else:
+	MEMORY = ('rss growth', 'process peak')
+
+def max_rss():
+	"""Return the most memory the process has held so far, in bytes."""
+	if resource is None:
+		return None
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# Linux counts in KiB, macOS in bytes.
+	return peak if sys.platform == 'darwin' else peak * 1024
+
+class Phase(object):
+	def __init__(self, name):
+		self.name = name
+		self.wall = 0.0
+		self.allocated = None
+		self.peak = None
+
+class PhaseProfiler(object):
+	"""Profiles the phases of a run, one ``with profiler.phase(name)`` each.
+
+	Every phase gets its wall time and, where tracemalloc is available, the
+	memory it allocated and kept along with its peak. Without tracemalloc
+	they're reported as the process's maximum resident set size at the end
+	of the phase and how much that grew during it, labelled as such. All phases share one
+	cProfile run, and the stack is sampled every interval seconds so the
+	samples can be written out as collapsed stacks for flamegraph tools.
+
+	"""
+	def __init__(self, interval=0.001):
+		self.interval = interval
+		self.phases = []
+		self.profile = cProfile.Profile()
+		# Collapsed stack -> number of samples.
+		self.stacks = {}
+		self._current = None
+
+	@contextmanager
+	def phase(self, name):
+		phase = Phase(name)
+		self.phases.append(phase)
+		self._current = phase
+		sampling = self._start_sampling()
+		if tracemalloc:
+			# Leave tracing as we found it, on or off.
+			tracing = tracemalloc.is_tracing()
+			if tracing:
+				if hasattr(tracemalloc, 'reset_peak'):
+					tracemalloc.reset_peak()
+				base = tracemalloc.get_traced_memory()[0]
+			else:
+				tracemalloc.start()
+				base = 0
+		else:
+			base = max_rss()
+		start = time.time()
+		self.profile.enable()
+		try:
+			yield phase
+		finally:
+			self.profile.disable()
+			phase.wall = time.time() - start
+			if tracemalloc:
+				current, phase.peak = tracemalloc.get_traced_memory()
+				phase.allocated = current - base
+				if not tracing:
+					tracemalloc.stop()
+			elif base is not None:
+				phase.peak = max_rss()
+				phase.allocated = phase.peak - base
+			if sampling:
+				self._stop_sampling(*sampling)
+			self._current = None
+
+	def _start_sampling(self):
+		"""Start sampling and return the handler and timer it replaced."""
+		if not hasattr(signal, 'setitimer'):
+			return None
+		handler = signal.signal(signal.SIGPROF, self._sample)
+		timer = signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+		return handler, timer
+
+	def _stop_sampling(self, handler, timer):
+		signal.setitimer(signal.ITIMER_PROF, *timer)
+		# None means the old handler wasn't installed from Python.
+		signal.signal(signal.SIGPROF, signal.SIG_DFL if handler is None else handler)
+
+	def _sample(self, signum, frame):
+		if self._current is None:
+			return
+		names = []
+		while frame is not None:
+			code = frame.f_code
+			names.append("%s:%s" % (os.path.basename(code.co_filename), code.co_name))
+			frame = frame.f_back
+		names.append(self._current.name)
+		stack = ';'.join(reversed(names))
+		self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+	def report(self, out=None, limit=15):
+		"""Write a per-phase summary and the hottest functions to out."""
+		out = out or sys.stdout
+		out.write("%-8s %10s %12s %12s\n" % (('phase', 'wall') + MEMORY))
+		for phase in self.phases:
+			if phase.allocated is None:
+				memory = ('n/a', 'n/a')
+			else:
+				memory = ("%.1fKiB" % (phase.allocated / 1024.0),
+						  "%.1fKiB" % (phase.peak / 1024.0))
+			out.write("%-8s %8.1fms %12s %12s\n" % (
+				(phase.name, phase.wall*1000) + memory))
+		out.write("%-8s %8.1fms\n" % (
+			'total', sum(phase.wall for phase in self.phases)*1000))
+		if not tracemalloc:
+			out.write("(rss growth is how far the process's maximum resident set size\n"
+					  " rose during the phase, process peak is that maximum at its end)\n")
+		out.write("\n")
+
+		stats = pstats.Stats(self.profile, stream=out)
+		stats.sort_stats('cumulative').print_stats(limit)
+
+	def write_folded(self, path):
+		"""Write the sampled stacks in the collapsed format flamegraphs read."""
+		with open(path, 'w') as f:
+			for stack, count in sorted(self.stacks.items()):
+				f.write("%s %d\n" % (stack, count))
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""Paint levels to images.
+
+This is the only module that needs PIL. Nothing else imports it, so levels
+can be built and queried without PIL installed or paying for its import.
+
+"""
+import logging
+
+try:
+	from PIL import Image, ImageDraw
+except ImportError:
+	import Image, ImageDraw
+
+from structs import pieces
+
+BACKGROUND = (124, 124, 124)
+
+def depth(block):
+	"""Return how many parents a block has."""
+	count = 0
+	while block.parent:
+		block = block.parent
+		count += 1
+	return count
+
+def paint(canvas, rect, color, origin=(0, 0)):
+	if color is None:
+		return
+	box = list(rect)
+	box[0] -= origin[0]
+	box[1] -= origin[1]
+	box[2] -= origin[0] + 1
+	box[3] -= origin[1] + 1
+	canvas.rectangle(box, fill=color)
+
+def paint_parts(canvas, block, origin=(0, 0)):
+	"""Paint the parts of a prefab instance."""
+	for part in block.parts():
+		for piece in pieces(part.rect, part.exclusions):
+			paint(canvas, piece, part.color, origin)
+
+def paint_block(canvas, block, rect, origin=(0, 0)):
+	"""Paint the part of a block inside rect."""
+	# Prefab instances are painted a part at a time.
+	if hasattr(block, 'parts'):
+		paint_parts(canvas, block, origin)
+		return
+	shared = block.rect.intersection(rect)
+	if shared is None:
+		return
+	for piece in pieces(shared, block.exclusions):
+		paint(canvas, piece, block.color, origin)
+
+def draw_index(index, canvas, rect):
+	"""Paint the rect portion of every block charged to an index.
+
+	Blocks are painted from their own rects, not the index's nodes, so every
+	backend paints the same, whatever it keeps in memory.
+
+	"""
+	charges = list(index)
+	# Force lower layers to the front of the line, then parents before
+	# the blocks they contain.
+	charges.sort(key=lambda block: (block.layer, depth(block)))
+	for block in charges:
+		logging.info("Painting: %s" % (block.name,))
+		paint_block(canvas, block, rect, (rect.left, rect.top))
+
+def render(index, rect, scale=1, mode='RGB'):
+	"""Return an Image of the rect portion of an index, scaled up by scale."""
+	im = Image.new(mode, (rect.width, rect.height), color=BACKGROUND)
+	canvas = ImageDraw.Draw(im)
+	draw_index(index, canvas, rect)
+	if scale != 1:
+		im = im.resize((rect.width*scale, rect.height*scale), Image.NEAREST)
+	return im
+
+class IncrementalRenderer(object):
+	"""A sink painting each block as soon as it is written.
+
+	Blocks are painted in the order they arrive, so parents have to come
+	before their children and lower layers before the ones overlapping them,
+	as they do from LevelGenerator.iter_generate().
+
+	"""
+	def __init__(self, rect, scale=1, mode='RGB'):
+		self.rect = rect
+		self.scale = scale
+		self.origin = (rect.left, rect.top)
+		self.im = Image.new(mode, (rect.width, rect.height), color=BACKGROUND)
+		self.canvas = ImageDraw.Draw(self.im)
+
+	def write(self, block):
+		paint_block(self.canvas, block, self.rect, self.origin)
+
+	def close(self):
+		pass
+
+	def image(self):
+		"""Return what has been painted so far, scaled up."""
+		if self.scale == 1:
+			return self.im.copy()
+		return self.im.resize((self.rect.width*self.scale,
+							   self.rect.height*self.scale), Image.NEAREST)
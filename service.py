@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""Serve generated levels over HTTP, or HTTP on a unix socket.
+
+    GET /level?seed=1&size=64&rooms=6&backend=quad&format=png
+
+Generation runs on a process pool. Concurrent requests for the same level
+share a single job, and finished levels are kept in an in-memory LRU cache
+bounded by size. Unlike the rest of the package this needs Python 3.7+.
+
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import time
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+import blocks
+import cache
+from generator import LevelGenerator
+
+FORMATS = {
+	'json':'application/json',
+	'png':'image/png',
+}
+
+# Parameter -> (type, smallest, largest) accepted from clients.
+PARAMETERS = OrderedDict([
+	('seed', (int, None, None)),
+	('size', (int, 8, 4096)),
+	('rooms', (int, 0, 1000)),
+])
+
+class BadRequest(Exception):
+	"""Raised when a request can't be turned into a level."""
+
+def parse_request(query):
+	"""Return the generator parameters and format asked for by a query string."""
+	fields = dict(parse_qsl(query))
+	defaults = LevelGenerator()
+	params = OrderedDict()
+	for name, (kind, low, high) in PARAMETERS.items():
+		try:
+			value = kind(fields.get(name, getattr(defaults, name)))
+		except ValueError:
+			raise BadRequest("%s must be an integer" % name)
+		if (low is not None and value < low) or (high is not None and value > high):
+			raise BadRequest("%s must be between %s and %s" % (name, low, high))
+		params[name] = value
+
+	params['backend'] = fields.get('backend', defaults.backend)
+	if params['backend'] not in blocks.INDEXES:
+		raise BadRequest("backend must be one of %s" % ', '.join(sorted(blocks.INDEXES)))
+	fmt = fields.get('format', 'png')
+	if fmt not in FORMATS:
+		raise BadRequest("format must be one of %s" % ', '.join(sorted(FORMATS)))
+	return params, fmt
+
+def build_level(params, fmt, scale=1):
+	"""Generate a level and return it encoded in fmt. Runs in a worker."""
+	generator = LevelGenerator(**params)
+	level = generator.generate()
+	if fmt == 'png':
+		return cache.encode_image(level, scale)
+	return cache.encode_index(generator, level)
+
+def _init_worker(log_level):
+	logging.root.setLevel(log_level)
+
+class LevelService(object):
+	"""Hands out encoded levels, generating each one at most once at a time."""
+	def __init__(self, workers=None, cache_bytes=64*1024*1024, scale=1):
+		# Forked workers would inherit, and hold open, the sockets of
+		# whichever connections were open when the pool grew.
+		self.pool = ProcessPoolExecutor(workers, multiprocessing.get_context('spawn'),
+										initializer=_init_worker,
+										initargs=(logging.root.level,))
+		self.cache_bytes = cache_bytes
+		self.scale = scale
+		# key -> encoded level, least recently used first.
+		self.cache = OrderedDict()
+		self.cached_bytes = 0
+		# key -> task generating the level.
+		self.pending = {}
+		self.stats = {'hits':0, 'coalesced':0, 'generated':0}
+
+	def close(self):
+		self.pool.shutdown()
+
+	async def get(self, params, fmt):
+		"""Return the encoded level for params."""
+		key = (fmt,) + tuple(params.items())
+		data = self.cache.get(key)
+		if data is not None:
+			self.cache.move_to_end(key)
+			self.stats['hits'] += 1
+			return data
+
+		task = self.pending.get(key)
+		if task is None:
+			task = asyncio.ensure_future(self._generate(key, params, fmt))
+			self.pending[key] = task
+		else:
+			self.stats['coalesced'] += 1
+		# One client going away shouldn't cancel the job for the others.
+		return await asyncio.shield(task)
+
+	async def _generate(self, key, params, fmt):
+		loop = asyncio.get_running_loop()
+		try:
+			data = await loop.run_in_executor(
+				self.pool, build_level, dict(params), fmt, self.scale)
+		finally:
+			del self.pending[key]
+		self.stats['generated'] += 1
+		self._store(key, data)
+		return data
+
+	def _store(self, key, data):
+		if len(data) > self.cache_bytes:
+			return
+		self.cache[key] = data
+		self.cached_bytes += len(data)
+		while self.cached_bytes > self.cache_bytes:
+			_, evicted = self.cache.popitem(last=False)
+			self.cached_bytes -= len(evicted)
+
+	async def handle(self, reader, writer):
+		"""Answer a single HTTP request on a connection."""
+		try:
+			request = await reader.readline()
+			# Headers carry nothing we need, but have to be read.
+			while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+				pass
+			try:
+				method, target, _ = request.decode('latin-1').split(' ', 2)
+			except ValueError:
+				return self._respond(writer, 400, b"malformed request\n")
+			url = urlsplit(target)
+			if method != 'GET' or url.path != '/level':
+				return self._respond(writer, 404, b"try GET /level\n")
+			try:
+				params, fmt = parse_request(url.query)
+			except BadRequest as e:
+				return self._respond(writer, 400, str(e).encode('utf-8') + b"\n")
+
+			data = await self.get(params, fmt)
+			self._respond(writer, 200, data, FORMATS[fmt])
+		except Exception:
+			logging.exception("Failed to answer request")
+			self._respond(writer, 500, b"level generation failed\n")
+		finally:
+			try:
+				await writer.drain()
+			except ConnectionError:
+				pass
+			writer.close()
+
+	def _respond(self, writer, status, body, content_type='text/plain'):
+		reason = {200:'OK', 400:'Bad Request', 404:'Not Found',
+				  500:'Internal Server Error'}[status]
+		writer.write(("HTTP/1.1 %d %s\r\nContent-Type: %s\r\n"
+					  "Content-Length: %d\r\nConnection: close\r\n\r\n" % (
+						  status, reason, content_type, len(body))).encode('latin-1'))
+		writer.write(body)
+
+	async def serve(self, host='127.0.0.1', port=8080, path=None):
+		"""Start listening on host:port, or on a unix socket at path."""
+		if path:
+			return await asyncio.start_unix_server(self.handle, path)
+		return await asyncio.start_server(self.handle, host, port)
+
+async def fetch(query, host='127.0.0.1', port=8080, path=None):
+	"""Request a level from a running service, returning (status, body)."""
+	if path:
+		reader, writer = await asyncio.open_unix_connection(path)
+	else:
+		reader, writer = await asyncio.open_connection(host, port)
+	writer.write(("GET /level?%s HTTP/1.1\r\nHost: %s\r\n\r\n" % (
+		query, host)).encode('latin-1'))
+	response = await reader.read()
+	writer.close()
+	head, _, body = response.partition(b'\r\n\r\n')
+	return int(head.split(b' ', 2)[1]), body
+
+async def load_test(queries, clients=16, **address):
+	"""Fetch queries from concurrent clients, returning latencies and elapsed time."""
+	queries = list(queries)
+	latencies = []
+
+	async def client():
+		while queries:
+			query = queries.pop()
+			start = time.time()
+			status, _ = await fetch(query, **address)
+			if status != 200:
+				raise RuntimeError("%s answered %s" % (query, status))
+			latencies.append(time.time() - start)
+
+	start = time.time()
+	await asyncio.gather(*[client() for _ in range(clients)])
+	return sorted(latencies), time.time() - start
+
+def percentile(ordered, fraction):
+	return ordered[min(len(ordered) - 1, int(len(ordered)*fraction))]
+
+async def benchmark(queries, clients=16, workers=None):
+	"""Load test a fresh service on an ephemeral port.
+
+	Returns the sorted latencies, the elapsed time and the service's stats.
+
+	"""
+	service = LevelService(workers)
+	server = await service.serve(port=0)
+	port = server.sockets[0].getsockname()[1]
+	try:
+		latencies, elapsed = await load_test(queries, clients, port=port)
+	finally:
+		server.close()
+		await server.wait_closed()
+		service.close()
+	return latencies, elapsed, service.stats
+
+async def serve_forever(args):
+	service = LevelService(args.workers, args.cache_mb*1024*1024, args.scale)
+	server = await service.serve(args.host, args.port, args.unix)
+	logging.warning("Serving levels on %s" % (args.unix or "%s:%s" % (args.host, args.port)))
+	try:
+		async with server:
+			await server.serve_forever()
+	finally:
+		service.close()
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Serve generated levels.")
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=8080)
+	parser.add_argument('--unix', help="listen on this unix socket instead")
+	parser.add_argument('--workers', type=int)
+	parser.add_argument('--cache-mb', type=int, default=64)
+	parser.add_argument('--scale', type=int, default=1)
+	parser.add_argument('--log', choices=sorted(blocks.LEVELS), default='warning')
+	args = parser.parse_args(argv)
+	logging.root.setLevel(blocks.LEVELS[args.log])
+	asyncio.run(serve_forever(args))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""Consumers of a stream of Blocks, such as LevelGenerator.iter_generate().
+
+A sink is written a block at a time and closed once the stream ends. Sinks
+keep nothing of the blocks they're written, so streaming a level through
+them takes the same memory whatever its size.
+
+"""
+import json
+import struct
+
+MAGIC = b'LVL1'
+
+# Every record starts with a tag. A kind is defined the first time a block
+# of its class is written, and blocks after it refer to the kind by number.
+KIND = 0
+BLOCK = 1
+
+_tag = struct.Struct('<B')
+_kind = struct.Struct('<BB')
+# kind, layer, left, top, width, height, has colour, red, green, blue,
+# length of the name
+_block = struct.Struct('<BbiiiiBBBBB')
+
+class NDJSONWriter(object):
+	"""Writes each block as a line of JSON to a text stream."""
+	def __init__(self, stream):
+		self.stream = stream
+
+	def write(self, block):
+		self.stream.write(json.dumps(block.describe(), sort_keys=True))
+		self.stream.write('\n')
+
+	def close(self):
+		self.stream.flush()
+
+class BinaryWriter(object):
+	"""Writes each block as a fixed size record to a binary stream.
+
+	Names are limited to 255 bytes and there can be at most 256 kinds of
+	block in a stream.
+
+	"""
+	def __init__(self, stream):
+		self.stream = stream
+		self.kinds = {}
+		stream.write(MAGIC)
+
+	def write(self, block):
+		info = block.describe()
+		kind = info['kind']
+		if kind not in self.kinds:
+			self.kinds[kind] = len(self.kinds)
+			name = kind.encode('utf-8')
+			self.stream.write(_tag.pack(KIND) + _kind.pack(self.kinds[kind], len(name)) + name)
+
+		name = info['name'].encode('utf-8')
+		color = info['color'] or [0, 0, 0]
+		self.stream.write(_tag.pack(BLOCK) + _block.pack(
+			self.kinds[kind], info['layer'], *(info['rect'] +
+			[info['color'] is not None] + color + [len(name)])) + name)
+
+	def close(self):
+		self.stream.flush()
+
+def _read(stream, size):
+	data = stream.read(size)
+	if len(data) != size:
+		raise ValueError("Truncated level stream")
+	return data
+
+def read_binary(stream):
+	"""Yield the blocks written by a BinaryWriter, described as plain data."""
+	if stream.read(len(MAGIC)) != MAGIC:
+		raise ValueError("Not a level stream")
+	kinds = {}
+	while True:
+		tag = stream.read(_tag.size)
+		if not tag:
+			return
+		tag, = _tag.unpack(tag)
+		if tag == KIND:
+			number, length = _kind.unpack(_read(stream, _kind.size))
+			kinds[number] = _read(stream, length).decode('utf-8')
+		elif tag == BLOCK:
+			fields = _block.unpack(_read(stream, _block.size))
+			kind, layer = fields[:2]
+			rect = list(fields[2:6])
+			has_color, color, length = fields[6], list(fields[7:10]), fields[10]
+			yield {
+				'kind':kinds[kind],
+				'name':_read(stream, length).decode('utf-8'),
+				'rect':rect,
+				'layer':layer,
+				'color':color if has_color else None,
+			}
+		else:
+			raise ValueError("Unknown record %d in level stream" % tag)
+
+def stream(blocks, *sinks):
+	"""Write every block to every sink, close the sinks and return the count."""
+	count = 0
+	for block in blocks:
+		for sink in sinks:
+			sink.write(block)
+		count += 1
+	for sink in sinks:
+		sink.close()
+	return count
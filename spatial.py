@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+import logging
+import math
+
+from structs import Rect, pieces
+
+class SpatialIndex(object):
+	"""The interface shared by everything Blocks can be charged to.
+
+	An index stores blocks in nodes. Every node has a ``rect``, a set of
+	``charges`` and a ``discharge(block)`` method. A charged Block keeps the
+	nodes it occupies in ``block.quads`` so it can tear itself down without
+	knowing which backend it lives in.
+
+	"""
+	def charge(self, block):
+		"""Charge a block, and its children, to the index's care"""
+		raise NotImplementedError
+
+	def dismiss(self, block, rect=None):
+		"""Dismiss a block, or a rect portion of one, from the index's service"""
+		block.tear_down(rect)
+
+	def hit(self, rect, strict=False):
+		"""Return a set of blocks that collide with a passed rect."""
+		raise NotImplementedError
+
+	def __iter__(self):
+		"""Iterate over every block charged to the index, once each."""
+		raise NotImplementedError
+
+class GridCell(object):
+	"""A single bucket of a GridIndex."""
+	def __init__(self, rect, index, key):
+		self.rect = rect
+		self.index = index
+		self.key = key
+		self.charges = set([])
+
+	def __repr__(self):
+		return "GridCell(%s)" % (self.rect,)
+
+	def discharge(self, block):
+		"""Release a block from this cell's care"""
+		block.quads.remove(self)
+		self.charges.remove(block)
+		self.attempt_tear_down()
+
+	def attempt_tear_down(self):
+		"""Drop the cell from its index once nothing is charged to it."""
+		if not self.charges:
+			return self.tear_down()
+		return False
+
+	def tear_down(self):
+		logging.debug("-- Tearing down %s" % self)
+		del self.index.cells[self.key]
+		return True
+
+class GridIndex(SpatialIndex):
+	"""A uniform grid spatial hash.
+
+	Blocks are charged to every cell their rect overlaps, except for cells
+	that lie entirely inside one of the block's exclusions. It beats the
+	Quad when blocks are of similar size and roughly ``cell_size`` across,
+	since a charge or a hit costs one dict lookup per overlapped cell.
+
+	"""
+	def __init__(self, rect, cell_size=8):
+		self.rect = rect
+		self.cell_size = cell_size
+		# (column, row) -> GridCell, only for cells that hold charges.
+		self.cells = {}
+
+	def __repr__(self):
+		return "GridIndex(%s, cell_size=%s)" % (self.rect, self.cell_size)
+
+	def __iter__(self):
+		seen = set([])
+		for cell in list(self.cells.values()):
+			for block in cell.charges:
+				if block not in seen:
+					seen.add(block)
+					yield block
+
+	def _keys(self, rect):
+		"""Return the (column, row) keys of the cells a rect overlaps."""
+		rect = self.rect.intersection(rect)
+		if rect is None:
+			return []
+		size = float(self.cell_size)
+		left = int((rect.left - self.rect.left) // size)
+		top = int((rect.top - self.rect.top) // size)
+		right = int(math.ceil((rect.right - self.rect.left) / size))
+		bottom = int(math.ceil((rect.bottom - self.rect.top) / size))
+		return [(x, y) for y in range(top, bottom) for x in range(left, right)]
+
+	def _cell_rect(self, key):
+		x, y = key
+		return Rect(self.rect.left + x*self.cell_size,
+					self.rect.top + y*self.cell_size,
+					self.cell_size, self.cell_size)
+
+	def charge(self, block):
+		"""Charge a block to the grid's care"""
+		logging.info("Charging %s to %s" % (block, self))
+		exclusions = block.exclusions
+		cells = []
+		for key in self._keys(block.rect):
+			cell = self.cells.get(key)
+			rect = cell.rect if cell else self._cell_rect(key)
+			if [exclusion for exclusion in exclusions if rect <= exclusion]:
+				continue
+			if cell is None:
+				cell = self.cells[key] = GridCell(rect, self, key)
+				logging.debug("Generating new %s" % cell)
+			cell.charges.add(block)
+			cells.append(cell)
+
+		if not cells:
+			logging.debug("Failure")
+		block.quads = cells
+
+		for child in block.children:
+			self.charge(child)
+
+	def hit(self, rect, strict=False):
+		"""Return a set of blocks that collide with a passed rect.
+
+		If strict is True then only blocks whose rects are fully contained
+		in the passed rect are returned. Otherwise a rect only collides with
+		the parts of a block outside its exclusions.
+
+		"""
+		hits = set([])
+		for key in self._keys(rect):
+			cell = self.cells.get(key)
+			if cell is None:
+				continue
+			for block in cell.charges:
+				if block in hits:
+					continue
+				if strict:
+					if block.rect <= rect:
+						hits.add(block)
+				elif block.rect in rect and [piece for piece in
+						pieces(block.rect, block.exclusions) if piece in rect]:
+					hits.add(block)
+		return hits
@@ -97,6 +97,33 @@ class Rect(object):
 	def copy(self):
 		return Rect(self.left, self.top, self.width, self.height)
 
+	def intersection(self, other):
+		"""Return the Rect shared by self and other, or None if they don't meet."""
+		if other not in self:
+			return None
+		return Rect(max(self.left, other.left), max(self.top, other.top),
+					min(self.right, other.right), min(self.bottom, other.bottom),
+					absolute=True)
+
+	def difference(self, other):
+		"""Return a list of Rects covering self but not other."""
+		shared = self.intersection(other)
+		if shared is None:
+			return [self.copy()]
+		pieces = []
+		if shared.top > self.top:
+			pieces.append(Rect(self.left, self.top, self.width, shared.top-self.top))
+		if shared.bottom < self.bottom:
+			pieces.append(Rect(self.left, shared.bottom,
+							   self.width, self.bottom-shared.bottom))
+		if shared.left > self.left:
+			pieces.append(Rect(self.left, shared.top,
+							   shared.left-self.left, shared.height))
+		if shared.right < self.right:
+			pieces.append(Rect(shared.right, shared.top,
+							   self.right-shared.right, shared.height))
+		return pieces
+
 	def fracture(self, point):
 		"""Fracture self about point and return the results
 
@@ -150,3 +177,11 @@ class Rect(object):
 	def ul(self): return Point(self.left, self.top)
 	@property
 	def lr(self): return Point(self.right, self.bottom)
+
+def pieces(rect, exclusions):
+	"""Return the Rects covering rect but none of the exclusions."""
+	remaining = [rect]
+	for exclusion in exclusions:
+		remaining = [piece for rect in remaining
+					 for piece in rect.difference(exclusion)]
+	return remaining
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+import json
+import os
+
+import cache
+from generator import LevelGenerator
+
+def test_keys(tmpdir):
+	level_cache = cache.LevelCache(str(tmpdir))
+	key = level_cache.key(LevelGenerator(1))
+	assert key == level_cache.key(LevelGenerator(1))
+	assert key != level_cache.key(LevelGenerator(2))
+	assert key != level_cache.key(LevelGenerator(1, rooms=2))
+	assert key != level_cache.key(LevelGenerator(1), scale=1)
+	assert level_cache.key(LevelGenerator(1), scale=1) != \
+		level_cache.key(LevelGenerator(1), scale=10)
+
+def test_fetch(tmpdir, monkeypatch):
+	level_cache = cache.LevelCache(str(tmpdir))
+	generator = LevelGenerator(1, size=32)
+	data = level_cache.fetch(generator)
+	assert json.loads(data.decode('utf-8'))['params']['seed'] == 1
+
+	# Warm fetches never generate.
+	def fail():
+		raise AssertionError("generated a cached level")
+	monkeypatch.setattr(generator, 'generate', fail)
+	assert level_cache.fetch(generator) == data
+	assert [key for _, _, key in level_cache.entries()] == [level_cache.key(generator)]
+
+def test_index_shared_across_scales(tmpdir):
+	level_cache = cache.LevelCache(str(tmpdir))
+	generator = LevelGenerator(1, size=32)
+	data = level_cache.fetch(generator, cache.INDEX, scale=1)
+	assert level_cache.fetch(generator, cache.INDEX, scale=10) == data
+	assert [key for _, _, key in level_cache.entries()] == [level_cache.key(generator)]
+
+def test_concurrent_put(tmpdir):
+	level_cache = cache.LevelCache(str(tmpdir))
+	key = level_cache.key(LevelGenerator(1))
+	level_cache.put(key, {cache.INDEX:b'first'})
+	# A second writer finishing the same entry leaves the first in place.
+	level_cache.put(key, {cache.INDEX:b'second'})
+	assert level_cache.get(key, cache.INDEX) == b'first'
+	assert os.listdir(str(tmpdir)) == [key]
+
+def test_eviction(tmpdir):
+	level_cache = cache.LevelCache(str(tmpdir))
+	generators = [LevelGenerator(seed, size=32) for seed in range(3)]
+	for generator in generators:
+		level_cache.fetch(generator)
+	# Make the second level the least recently used.
+	os.utime(os.path.join(str(tmpdir), level_cache.key(generators[1])), (0, 0))
+
+	level_cache.max_bytes = sum(size for _, size, _ in level_cache.entries()) - 1
+	level_cache.evict()
+	keys = set(key for _, _, key in level_cache.entries())
+	assert keys == set([level_cache.key(generators[0]), level_cache.key(generators[2])])
+	assert not [name for name in os.listdir(str(tmpdir)) if name.startswith('.')]
+
+def test_stale_leftovers(tmpdir):
+	level_cache = cache.LevelCache(str(tmpdir))
+	for name in ['.tmp-dead', '.evicted-dead', '.tmp-busy']:
+		tmpdir.mkdir(name).join(cache.INDEX).write('x')
+	for name in ['.tmp-dead', '.evicted-dead']:
+		os.utime(os.path.join(str(tmpdir), name), (0, 0))
+
+	level_cache.evict()
+	assert os.listdir(str(tmpdir)) == ['.tmp-busy']
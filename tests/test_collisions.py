@@ -1,26 +1,33 @@
 #!/usr/bin/env python
 
+import pytest
+
 import blocks
 from structs import Rect
 
-def test_valid_single_room():
-	tree = blocks.Quad(Rect(0, 0, 8, 8))
+backends = pytest.mark.parametrize('backend', sorted(blocks.INDEXES))
+
+@backends
+def test_valid_single_room(backend):
+	tree = blocks.INDEXES[backend](Rect(0, 0, 8, 8))
 
 	room = blocks.Room(Rect(3, 3, 3, 2), name='cool_room')
 	tree.charge(room)
 	hits = tree.hit(Rect(3, 3, 3, 2))
 	assert hits == set([room])
 
-def test_invalid_single_room():
-	tree = blocks.Quad(Rect(0, 0, 32, 32))
+@backends
+def test_invalid_single_room(backend):
+	tree = blocks.INDEXES[backend](Rect(0, 0, 32, 32))
 
 	room = blocks.Room(Rect(3, 3, 16, 7), name='cool_room')
 	tree.charge(room)
 	hits = tree.hit(Rect(0, 0, 1, 2))
 	assert set([room]) not in hits
 
-def test_valid_two_room():
-	tree = blocks.Quad(Rect(0, 0, 32, 32))
+@backends
+def test_valid_two_room(backend):
+	tree = blocks.INDEXES[backend](Rect(0, 0, 32, 32))
 
 	room = blocks.Room(Rect(3, 3, 16, 7), name='cool_room')
 	tree.charge(room)
@@ -31,8 +38,22 @@ def test_valid_two_room():
 	hits = tree.hit(bed.pillow.rect)#tree.hit(Rect(3, 4, 2, 2))
 	assert hits == set([room, bed, bed.pillow])
 
-def test_removal():
-	tree = blocks.Quad(Rect(0, 0, 32, 32))
+@backends
+def test_several_exclusions(backend):
+	tree = blocks.INDEXES[backend](Rect(0, 0, 16, 16))
+
+	room = blocks.Room(Rect(4, 4, 8, 8), name='cool_room')
+	# A door through the left of the wall.
+	room.wall.exclusions = room.wall._exclusions + [Rect(-1, 3, 1, 2)]
+	tree.charge(room)
+
+	# Through the doorway and into the room, missing the wall.
+	assert tree.hit(Rect(3, 7, 3, 1)) == set([room])
+	assert tree.hit(Rect(3, 6, 3, 1)) == set([room, room.wall])
+
+@backends
+def test_removal(backend):
+	tree = blocks.INDEXES[backend](Rect(0, 0, 32, 32))
 
 	room = blocks.Room(Rect(3, 3, 16, 7), name='cool_room')
 	tree.charge(room)
@@ -44,3 +65,16 @@ def test_removal():
 
 	hits = tree.hit(bed.pillow.rect)#tree.hit(Rect(3, 4, 2, 2))
 	assert set([bed, bed.pillow]) not in hits
+
+@backends
+def test_iterate(backend):
+	tree = blocks.INDEXES[backend](Rect(0, 0, 32, 32))
+
+	room = blocks.Room(Rect(3, 3, 16, 7), name='cool_room')
+	tree.charge(room)
+
+	bed = blocks.Bed(Rect(0, 0, 5, 8), room, name='cool_bed')
+	tree.charge(bed)
+	bed.tear_down()
+
+	assert set(tree) == set([room, room.wall])
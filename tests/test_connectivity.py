@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+import random
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+import blocks
+import connectivity
+from generator import LevelGenerator
+from structs import Rect
+
+def flood(grid):
+	"""Label a grid the slow way, a cell at a time."""
+	labels = numpy.zeros(grid.shape, dtype=int)
+	count = 0
+	for y, x in zip(*numpy.nonzero(grid)):
+		if labels[y, x]:
+			continue
+		count += 1
+		labels[y, x] = count
+		stack = [(y, x)]
+		while stack:
+			y, x = stack.pop()
+			for ny, nx in [(y-1, x), (y+1, x), (y, x-1), (y, x+1)]:
+				if 0 <= ny < grid.shape[0] and 0 <= nx < grid.shape[1] \
+						and grid[ny, nx] and not labels[ny, nx]:
+					labels[ny, nx] = count
+					stack.append((ny, nx))
+	return labels, count
+
+@pytest.mark.parametrize('density', [0.3, 0.5, 0.7])
+def test_label(density):
+	rng = random.Random(density)
+	grid = numpy.array([[rng.random() < density for _ in range(40)]
+						for _ in range(30)])
+	labels, count = connectivity.label(grid)
+	expected, expected_count = flood(grid)
+	assert count == expected_count
+	# Components may be numbered differently but must match cell for cell.
+	pairs = set(zip(labels[grid], expected[grid]))
+	assert len(pairs) == count
+	assert (labels[~grid] == 0).all()
+
+def test_empty():
+	labels, count = connectivity.label(numpy.zeros((4, 4), dtype=bool))
+	assert count == 0 and not labels.any()
+
+def build(doors):
+	"""Return a level with three rooms, with doors in the walls listed."""
+	level = blocks.Level(Rect(0, 0, 32, 16), name='level')
+	index = level.build_index()
+	index.charge(level)
+	for left in [2, 12, 22]:
+		room = blocks.Room(Rect(left, 2, 8, 8), level)
+		if left in doors:
+			# Doors through the left and right of the wall.
+			room.wall.exclusions = room.wall._exclusions + [
+				Rect(-1, 3, 1, 2), Rect(8, 3, 1, 2)]
+		index.charge(room)
+	level.index = index
+	return level
+
+def test_rooms():
+	walled = build(doors=[])
+	assert len(connectivity.components(walled)) == 3
+	assert not connectivity.connected(walled)
+
+	level = build(doors=[2, 12])
+	groups = connectivity.components(level)
+	assert [[room.rect.left for room in group] for group in groups] == [[2, 12], [22]]
+
+	assert connectivity.connected(build(doors=[2, 12, 22]))
+
+def test_generated_rooms_are_walled_in():
+	level = LevelGenerator(1).generate()
+	rooms = [block for block in level.index if isinstance(block, blocks.Room)]
+	assert len(connectivity.components(level)) == len(rooms)
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+
+import pytest
+
+import blocks
+from generator import LevelGenerator
+
+def layout(level):
+	return sorted((block.__class__.__name__, tuple(block.rect))
+				  for block in level.index)
+
+def test_reproducible():
+	assert layout(LevelGenerator(7).generate()) == layout(LevelGenerator(7).generate())
+	assert layout(LevelGenerator(7).generate()) != layout(LevelGenerator(8).generate())
+
+@pytest.mark.parametrize('backend', sorted(blocks.INDEXES))
+def test_no_collisions(backend):
+	level = LevelGenerator(3, backend=backend).generate()
+	rooms = [room for room in level.children if isinstance(room, blocks.Room)]
+	assert rooms
+	for room in rooms:
+		others = level.index.hit(room.wall.rect) - set([level])
+		assert [block for block in others if block.parent is level] == [room]
+
+@pytest.mark.parametrize('backend', sorted(blocks.INDEXES))
+def test_backends_agree(backend):
+	assert layout(LevelGenerator(5, backend=backend).generate()) == \
+		layout(LevelGenerator(5).generate())
+
+@pytest.mark.parametrize('backend, options', [
+	(backend, {}) for backend in sorted(blocks.INDEXES)] + [
+	('chunked', {'chunk_size':16, 'max_chunks':2})])
+def test_backends_render_alike(backend, options):
+	render = pytest.importorskip('render')
+	level = LevelGenerator(0, backend=backend, **options).generate()
+	expected = LevelGenerator(0).generate()
+	image = render.render(level.index, level.rect)
+	assert list(image.getdata()) == \
+		list(render.render(expected.index, expected.rect).getdata())
+	if hasattr(level.index, 'close'):
+		level.index.close()
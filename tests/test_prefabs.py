@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+import blocks
+import prefab
+from structs import Rect
+
+def make_bed_prefab():
+	bed = blocks.Bed(Rect(0, 0, 4, 8), name='bed')
+	return prefab.Prefab.from_block(bed)
+
+def test_capture():
+	bed = make_bed_prefab()
+	assert bed.rect == Rect(0, 0, 4, 8)
+	assert sorted(part.name for part in bed.parts) == ['bed', 'pillow', 'sheet']
+	assert bed.parts[0].name == 'bed'
+
+def test_instance_is_single_entry():
+	tree = blocks.Quad(Rect(0, 0, 32, 32))
+	bed = make_bed_prefab()
+	first = bed.stamp(2, 2)
+	second = bed.stamp(10, 2)
+	tree.charge(first)
+	tree.charge(second)
+
+	assert not first.children
+	assert set(tree) == set([first, second])
+	assert tree.hit(Rect(11, 3, 1, 1)) == set([second])
+
+def test_expand():
+	tree = blocks.Quad(Rect(0, 0, 32, 32))
+	room = blocks.Room(Rect(4, 4, 16, 16), name='room')
+	tree.charge(room)
+	instance = make_bed_prefab().stamp(2, 2, room)
+	tree.charge(instance)
+
+	# The pillow sits at (1, 1) in the bed, which sits at (6, 6).
+	rect = Rect(7, 7, 1, 1)
+	parts = prefab.expand(tree.hit(rect), rect)
+	names = sorted(getattr(part, 'name') for part in parts)
+	assert 'pillow' in names and 'bed' in names and 'room' in names
+	pillow = [part for part in parts if part.name == 'pillow'][0]
+	assert pillow.rect == Rect(7, 7, 2, 1)
+	assert pillow.kind is blocks.Decor
+
+def test_wall_exclusions():
+	room = blocks.Room(Rect(0, 0, 4, 4), name='room')
+	instance = prefab.Prefab.from_block(room).stamp(10, 10)
+	assert instance.rect == Rect(9, 9, 6, 6)
+	assert [part.name for part in instance.parts(Rect(11, 11, 1, 1))] == ['room']
+	assert [part.name for part in instance.parts(Rect(9, 9, 1, 1))] == ['wall']
+
+def test_doorway():
+	room = blocks.Room(Rect(0, 0, 4, 4), name='room')
+	room.wall.exclusions = room.wall._exclusions + [Rect(-1, 1, 1, 2)]
+	instance = prefab.Prefab.from_block(room).stamp(10, 10)
+
+	# Through the doorway and into the room, missing the wall.
+	assert [part.name for part in instance.parts(Rect(9, 11, 3, 1))] == ['room']
+	assert [part.name for part in instance.parts(Rect(9, 10, 3, 1))] == ['room', 'wall']
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+
+import io
+import signal
+import sys
+
+import pytest
+
+import profiling
+
+def test_phase_restores_state():
+	if not hasattr(signal, 'setitimer'):
+		pytest.skip("no profiling timer on this platform")
+	def handler(signum, frame):
+		pass
+	previous = signal.signal(signal.SIGPROF, handler)
+	tracing = profiling.tracemalloc and profiling.tracemalloc.is_tracing()
+	try:
+		profiler = profiling.PhaseProfiler()
+		with profiler.phase('build'):
+			junk = [[0] * 1000 for _ in range(100)]
+		assert signal.getsignal(signal.SIGPROF) is handler
+		if profiling.tracemalloc:
+			assert profiling.tracemalloc.is_tracing() == tracing
+	finally:
+		signal.signal(signal.SIGPROF, previous or signal.SIG_DFL)
+
+	phase, = profiler.phases
+	assert phase.peak is not None and phase.allocated is not None
+
+def test_report_labels_memory():
+	profiler = profiling.PhaseProfiler()
+	with profiler.phase('build'):
+		pass
+	out = io.StringIO() if sys.version_info[0] > 2 else io.BytesIO()
+	profiler.report(out, limit=1)
+	header = out.getvalue().splitlines()[0]
+	if profiling.tracemalloc:
+		assert 'allocated' in header
+	else:
+		assert 'rss growth' in header and 'process peak' in header
+		assert 'allocated' not in header
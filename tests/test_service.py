@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+import json
+import sys
+
+import pytest
+
+if sys.version_info < (3, 7):
+	pytest.skip("the service needs Python 3.7+", allow_module_level=True)
+
+import asyncio
+
+import service
+
+def test_parse_request():
+	params, fmt = service.parse_request('seed=4&size=32&format=json')
+	assert params['seed'] == 4 and params['size'] == 32
+	assert params['backend'] == 'quad'
+	assert fmt == 'json'
+
+	for query in ['seed=x', 'size=100000', 'backend=nope', 'format=gif']:
+		with pytest.raises(service.BadRequest):
+			service.parse_request(query)
+
+@pytest.fixture
+def loop():
+	loop = asyncio.new_event_loop()
+	asyncio.set_event_loop(loop)
+	yield loop
+	asyncio.set_event_loop(None)
+	loop.close()
+
+@pytest.fixture
+def level_service():
+	level_service = service.LevelService(workers=1)
+	yield level_service
+	level_service.close()
+
+def test_coalescing_and_cache(loop, level_service):
+	params, fmt = service.parse_request('seed=4&size=32&format=json')
+
+	first, second = loop.run_until_complete(asyncio.gather(
+		level_service.get(params, fmt), level_service.get(params, fmt)))
+	third = loop.run_until_complete(level_service.get(params, fmt))
+	assert first == second == third
+	assert level_service.stats == {'generated':1, 'coalesced':1, 'hits':1}
+	assert json.loads(first.decode('utf-8'))['blocks']
+
+def test_http(loop, level_service):
+	server = loop.run_until_complete(level_service.serve(port=0))
+	port = server.sockets[0].getsockname()[1]
+	try:
+		status, body = loop.run_until_complete(
+			service.fetch('seed=1&size=32&format=json', port=port))
+		bad_status, _ = loop.run_until_complete(
+			service.fetch('size=nope', port=port))
+	finally:
+		server.close()
+		loop.run_until_complete(server.wait_closed())
+
+	assert status == 200
+	assert json.loads(body.decode('utf-8'))['params']['seed'] == 1
+	assert bad_status == 400
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+import pytest
+
+import blocks
+from structs import Rect
+
+def layout(tree):
+	"""Capture the shape of a tree and the quads each block holds."""
+	shape = []
+	for quad in tree.walk():
+		shape.append((tuple(quad.rect), sorted(block.name for block in quad.charges)))
+	held = dict((block.name, list(block.quads)) for block in tree)
+	return shape, held
+
+def test_restore_charge():
+	tree = blocks.Quad(Rect(0, 0, 32, 32))
+	room = blocks.Room(Rect(3, 3, 16, 7), name='room')
+	tree.charge(room)
+	before = layout(tree)
+
+	snapshot = tree.snapshot()
+	bed = blocks.Bed(Rect(0, 0, 5, 8), room, name='bed')
+	tree.charge(bed)
+	assert layout(tree) != before
+
+	tree.restore(snapshot)
+	assert layout(tree) == before
+	assert not bed.quads
+	assert not tree.hit(Rect(4, 4, 1, 1)) & set([bed, bed.pillow, bed.sheet])
+
+	# The bed is gone from the room too, so recharging the room leaves it out.
+	assert bed not in room.children
+	tree.charge(room)
+	assert bed not in set(tree)
+
+def test_restore_tear_down():
+	tree = blocks.Quad(Rect(0, 0, 32, 32))
+	room = blocks.Room(Rect(3, 3, 16, 7), name='room')
+	tree.charge(room)
+	bed = blocks.Bed(Rect(0, 0, 5, 8), room, name='bed')
+	tree.charge(bed)
+	before = layout(tree)
+
+	snapshot = tree.snapshot()
+	bed.tear_down()
+	assert bed not in room.children
+
+	tree.restore(snapshot)
+	assert layout(tree) == before
+	assert bed in room.children
+	assert bed.pillow in tree.hit(bed.pillow.rect)
+
+def test_nested_snapshots():
+	tree = blocks.Quad(Rect(0, 0, 32, 32))
+	first = tree.snapshot()
+	room = blocks.Room(Rect(3, 3, 16, 7), name='room')
+	tree.charge(room)
+	after_room = layout(tree)
+
+	second = tree.snapshot()
+	table = blocks.Furniture(Rect(1, 1, 4, 3), room, name='table')
+	tree.charge(table)
+
+	tree.restore(second)
+	assert layout(tree) == after_room
+	tree.restore(first)
+	assert not [quad for quad in tree.quads if quad]
+	assert not tree.charges
+
+def test_restore_without_snapshot():
+	tree = blocks.Quad(Rect(0, 0, 32, 32))
+	with pytest.raises(ValueError):
+		tree.restore(0)
+
+def test_restore_keeps_earlier_links():
+	tree = blocks.Quad(Rect(0, 0, 32, 32))
+	level = blocks.Level(Rect(0, 0, 32, 32), name='level')
+	tree.charge(level)
+	room = blocks.Room(Rect(3, 3, 16, 7), level, name='room')
+
+	# Built before the snapshot, charged after it.
+	snapshot = tree.snapshot()
+	tree.charge(room)
+	tree.restore(snapshot)
+	assert room in level.children
+	assert not room.quads
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+import io
+import json
+
+import pytest
+
+import blocks
+import sinks
+from generator import LevelGenerator, by_position, subtree
+
+def describe(blocks):
+	return [block.describe() for block in sorted(blocks, key=by_position)]
+
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_generate(seed):
+	streamed = list(LevelGenerator(seed, rooms=10).iter_generate())
+	level = LevelGenerator(seed, rooms=10).generate()
+	assert describe(streamed) == describe(level.index)
+	assert describe(streamed) == describe(subtree(streamed[0]))
+
+def test_parents_first():
+	seen = set()
+	for block in LevelGenerator(3, rooms=10).iter_generate():
+		assert block.parent is None or block.parent in seen
+		seen.add(block)
+
+def test_ndjson(tmpdir):
+	path = str(tmpdir.join('level.ndjson'))
+	generator = LevelGenerator(2)
+	with open(path, 'w') as f:
+		count = sinks.stream(generator.iter_generate(), sinks.NDJSONWriter(f))
+	with open(path) as f:
+		lines = [json.loads(line) for line in f]
+	assert len(lines) == count
+	assert lines == [block.describe() for block in generator.iter_generate()]
+
+def test_binary():
+	generator = LevelGenerator(2)
+	out = io.BytesIO()
+	sinks.stream(generator.iter_generate(), sinks.BinaryWriter(out))
+	read = list(sinks.read_binary(io.BytesIO(out.getvalue())))
+	assert read == [block.describe() for block in generator.iter_generate()]
+
+	with pytest.raises(ValueError):
+		list(sinks.read_binary(io.BytesIO(out.getvalue()[:-1])))
+
+def test_incremental_renderer():
+	render = pytest.importorskip('render')
+	generator = LevelGenerator(4, size=32)
+	level = generator.generate()
+	renderer = render.IncrementalRenderer(level.rect, scale=2)
+	sinks.stream(generator.iter_generate(), renderer)
+	expected = render.render(level.index, level.rect, scale=2)
+	assert list(renderer.image().getdata()) == list(expected.getdata())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+import gc
+import os
+import subprocess
+import sys
+
+import blocks
+import world
+from structs import Rect
+
+def test_out_of_bounds_charge():
+	tree = world.World(Rect(0, 0, 32, 32))
+
+	lump = blocks.Block(Rect(32, 32, 8, 8), name='lump')
+	tree.charge(lump)
+	assert tree.hit(Rect(35, 35, 1, 1)) == set([lump])
+	assert list(tree.chunks) == [(1, 1)]
+
+def test_spanning_charge():
+	tree = world.World(chunk_size=8)
+
+	block = blocks.Block(Rect(-4, -4, 8, 8), name='spanning')
+	tree.charge(block)
+	assert len(tree.chunks) == 4
+	for rect in [Rect(-4, -4, 1, 1), Rect(3, 3, 1, 1), Rect(-1, 0, 2, 1)]:
+		assert tree.hit(rect) == set([block])
+	assert tree.hit(Rect(4, 4, 1, 1)) == set([])
+
+def test_dismiss_drops_chunks():
+	tree = world.World(chunk_size=8)
+
+	block = blocks.Block(Rect(4, 4, 8, 8), name='spanning')
+	tree.charge(block)
+	tree.dismiss(block)
+	assert not block.quads
+	assert not tree.chunks
+
+def test_eviction(tmpdir):
+	tree = world.World(chunk_size=8, max_chunks=2, spill_dir=str(tmpdir))
+
+	room = blocks.Room(Rect(0, 0, 30, 6), name='room')
+	tree.charge(room)
+	assert len(tree.chunks) == 2
+	assert tree.spilled
+	assert len(os.listdir(str(tmpdir))) == len(tree.spilled)
+
+	# Reading the first chunk back in brings the room's charges with it.
+	assert tree.hit(Rect(1, 1, 1, 1)) == set([room])
+	assert (0, 0) in tree.chunks
+	assert set(tree) == set([room, room.wall])
+
+def test_evicted_dismiss(tmpdir):
+	tree = world.World(chunk_size=8, max_chunks=1, spill_dir=str(tmpdir))
+
+	block = blocks.Block(Rect(0, 0, 24, 4), name='long')
+	tree.charge(block)
+	tree.dismiss(block)
+	assert not block.quads
+	assert not tree.hit(Rect(0, 0, 24, 4))
+	assert not os.listdir(str(tmpdir))
+
+def test_backend_without_import():
+	# Levels find the chunked backend without anything importing world.
+	here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	statement = ("import blocks, structs; "
+				 "print(blocks.Level(structs.Rect(0, 0, 8, 8), backend='chunked')"
+				 ".build_index().__class__.__name__)")
+	output = subprocess.check_output([sys.executable, '-c', statement], cwd=here)
+	assert output.decode('utf-8').split() == ['World']
+
+def test_dead_block_charges(tmpdir):
+	tree = world.World(chunk_size=8, max_chunks=1, spill_dir=str(tmpdir))
+
+	doomed = blocks.Block(Rect(0, 0, 2, 2), name='doomed')
+	tree.charge(doomed)
+	# Spill the doomed block's chunk, then let the block die.
+	tree.charge(blocks.Block(Rect(40, 40, 2, 2), name='spill'))
+	del doomed
+	gc.collect()
+
+	# Whichever block comes next, perhaps at the same id, owns only itself.
+	block = blocks.Block(Rect(40, 40, 2, 2), name='block')
+	tree.charge(block)
+	assert [tuple(quad.rect) for quad in block.quads] == [(40, 40, 42, 42)]
+	# Reading the dead block's chunk back in charges nothing to it.
+	assert tree.hit(Rect(0, 0, 2, 2)) == set([])
+	assert not block.quads
+
+def test_close():
+	tree = world.World(chunk_size=8, max_chunks=1)
+	tree.charge(blocks.Block(Rect(0, 0, 24, 4), name='long'))
+	spill_dir = tree.spill_dir
+	assert os.listdir(spill_dir)
+	tree.close()
+	assert not os.path.exists(spill_dir)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+import itertools
+import logging
+import math
+import os
+import shutil
+import tempfile
+import weakref
+
+try:
+	import cPickle as pickle
+except ImportError:
+	import pickle
+
+from collections import OrderedDict
+
+import blocks
+from spatial import SpatialIndex
+from structs import Point, Rect
+
+class World(SpatialIndex):
+	"""An unbounded index made of fixed size chunks, each with its own Quad.
+
+	Chunks are created the first time something is charged to them, so the
+	world grows in whichever direction the level does without deepening the
+	trees it already has. Blocks spanning several chunks are charged to each
+	of them, clipped to the chunk's rect.
+
+	If max_chunks is set, only that many chunks are kept in memory. The least
+	recently used chunks are spilled to spill_dir and read back in on demand.
+	Spilled charges refer back to their blocks, which must stay alive (as
+	they do when they belong to a Level) to be recharged when the chunk is
+	loaded again. Use dismiss rather than tearing down blocks directly, so
+	the chunks a block lives in are loaded before it goes. Without a
+	spill_dir chunks are spilled to a temporary directory, which close()
+	removes.
+
+	"""
+	def __init__(self, rect=None, chunk_size=32, max_chunks=None, spill_dir=None):
+		# The passed rect only anchors the chunk grid.
+		self.origin = rect.ul if rect else Point(0, 0)
+		self.chunk_size = chunk_size
+		self.max_chunks = max_chunks
+		self.spill_dir = spill_dir
+		self._temporary = spill_dir is None
+		# Resident chunks, least recently used first.
+		self.chunks = OrderedDict()
+		self.spilled = set([])
+		# Spilled charges are stored by a serial number unique to the world,
+		# as ids of dead blocks are reused, and resolved through these.
+		self.serials = weakref.WeakKeyDictionary()
+		self.blocks = weakref.WeakValueDictionary()
+		self._counter = itertools.count()
+
+	def __repr__(self):
+		return "World(chunk_size=%s, chunks: %s, spilled: %s)" % (
+			self.chunk_size, len(self.chunks), len(self.spilled))
+
+	def __iter__(self):
+		seen = set([])
+		for key in list(self.chunks) + list(self.spilled):
+			for block in self._chunk(key):
+				if block not in seen:
+					seen.add(block)
+					yield block
+
+	def _keys(self, rect):
+		"""Return the keys of every chunk a rect overlaps."""
+		size = float(self.chunk_size)
+		left = int(math.floor((rect.left - self.origin.x) / size))
+		top = int(math.floor((rect.top - self.origin.y) / size))
+		right = int(math.ceil((rect.right - self.origin.x) / size))
+		bottom = int(math.ceil((rect.bottom - self.origin.y) / size))
+		return [(x, y) for y in range(top, bottom) for x in range(left, right)]
+
+	def _chunk_rect(self, key):
+		x, y = key
+		return Rect(self.origin.x + x*self.chunk_size,
+					self.origin.y + y*self.chunk_size,
+					self.chunk_size, self.chunk_size)
+
+	def _chunk_path(self, key):
+		if self.spill_dir is None:
+			self.spill_dir = tempfile.mkdtemp(prefix='chunks-')
+		return os.path.join(self.spill_dir, '%d_%d.chunk' % key)
+
+	def close(self):
+		"""Forget spilled chunks and remove the temporary spill directory."""
+		for key in list(self.spilled):
+			try:
+				os.remove(self._chunk_path(key))
+			except OSError:
+				pass
+		self.spilled.clear()
+		if self._temporary and self.spill_dir is not None:
+			shutil.rmtree(self.spill_dir, ignore_errors=True)
+			self.spill_dir = None
+
+	def _chunk(self, key, create=False):
+		"""Return the chunk at key, loading or creating it if need be.
+
+		Returns None when the chunk doesn't exist and create is False.
+
+		"""
+		chunk = self.chunks.pop(key, None)
+		if chunk is None:
+			if key in self.spilled:
+				chunk = self._load(key)
+			elif create:
+				chunk = blocks.Quad(self._chunk_rect(key))
+				logging.debug("Generating new chunk %s" % chunk)
+			else:
+				return None
+		# Re-inserting marks the chunk as the most recently used.
+		self.chunks[key] = chunk
+
+		if self.max_chunks is not None:
+			while len(self.chunks) > max(self.max_chunks, 1):
+				self._evict(next(iter(self.chunks)))
+		return chunk
+
+	def _evict(self, key):
+		"""Spill a chunk to disk, releasing its quads."""
+		chunk = self.chunks.pop(key)
+		logging.debug("Evicting chunk %s" % chunk)
+		records = {}
+		for quad in chunk.walk():
+			for block in quad.charges:
+				records.setdefault(self.serials[block], []).append(tuple(quad.rect))
+				block.quads.remove(quad)
+		with open(self._chunk_path(key), 'wb') as f:
+			pickle.dump(records, f, pickle.HIGHEST_PROTOCOL)
+		self.spilled.add(key)
+
+	def _load(self, key):
+		"""Read a spilled chunk back in and recharge its blocks."""
+		path = self._chunk_path(key)
+		with open(path, 'rb') as f:
+			records = pickle.load(f)
+		os.remove(path)
+		self.spilled.discard(key)
+
+		chunk = blocks.Quad(self._chunk_rect(key))
+		logging.debug("Loading chunk %s" % chunk)
+		for serial, rects in records.items():
+			block = self.blocks.get(serial)
+			if block is None:
+				continue
+			for rect in rects:
+				# Stored rects already map around the block's exclusions.
+				block.quads.extend(
+					chunk.charge_rect(block, Rect(*rect, absolute=True)))
+		return chunk
+
+	def charge(self, block):
+		"""Charge a block to the world's care"""
+		logging.info("Charging %s to %s" % (block, self))
+		if block not in self.serials:
+			serial = next(self._counter)
+			self.serials[block] = serial
+			self.blocks[serial] = block
+		block.quads = []
+		exclusions = block.exclusions
+		for key in self._keys(block.rect):
+			chunk = self._chunk(key, create=True)
+			rect = chunk.rect.intersection(block.rect)
+			block.quads.extend(chunk.charge_rect(block, rect, exclusions))
+
+		for child in block.children:
+			self.charge(child)
+
+	def dismiss(self, block, rect=None):
+		"""Dismiss a block, or a rect portion of one, from the world's service"""
+		# Work a chunk at a time so a block spanning more chunks than the
+		# memory budget allows is still fully torn down.
+		for key in self._keys(rect or block.rect):
+			chunk = self._chunk(key)
+			if chunk is None:
+				continue
+			portion = chunk.rect if rect is None else chunk.rect.intersection(rect)
+			block.tear_down(portion)
+
+			if not chunk.charges and not [quad for quad in chunk.quads if quad]:
+				logging.debug("Dropping empty chunk %s" % chunk)
+				del self.chunks[key]
+
+	def hit(self, rect, strict=False):
+		"""Return a set of blocks that collide with a passed rect."""
+		hits = set([])
+		for key in self._keys(rect):
+			chunk = self._chunk(key)
+			if chunk:
+				chunk.hit(chunk.rect.intersection(rect), strict, hits)
+		return hits